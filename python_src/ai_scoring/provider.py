@@ -9,9 +9,9 @@ from typing import Dict, List
 
 import requests
 
-from python_src.config import AI_API_REQUEST_DELAY_SECONDS
 from python_src.utils.logger import get_logger
-from python_src.utils.db import get_db_connection
+from python_src.utils.rate_limiter import ai_api_limiter, retry_after_seconds
+from python_src.utils.db import insert_ai_responses_batch, thread_db_connection
 from python_src.ai_scoring.scorer import parse_ai_batch_response
 
 logger = get_logger(__name__)
@@ -68,7 +68,7 @@ def call_ai_api_batch_for_relevance(
 
         for attempt in range(max_retries):
             try:
-                time.sleep(AI_API_REQUEST_DELAY_SECONDS)
+                ai_api_limiter.acquire()
                 logger.debug("正在调用 %s (%s/%s)…", ai_provider, attempt + 1, max_retries)
 
                 # 打印请求详情用于调试（脱敏API密钥）
@@ -146,7 +146,12 @@ def call_ai_api_batch_for_relevance(
                     return [] # 在最终失败时返回空列表
                 
                 delay *= 2
-                time.sleep(delay)
+                response = getattr(exc, "response", None)
+                if response is not None and response.status_code == 429:
+                    # 限流：暂停共享限流器，让所有并发批次一起退避
+                    ai_api_limiter.pause(retry_after_seconds(response.headers, delay))
+                else:
+                    time.sleep(delay)
                 
     except Exception as exc:  # pylint: disable=broad-except
         logger.error("调用 %s API 发生未知错误: %s", ai_provider, exc)
@@ -174,25 +179,18 @@ def save_api_response(
         request_content: 请求内容的JSON字符串
         response_content: 响应内容的JSON字符串
         prompt_type: 提示词类型（"default"或"custom"）
+
+    在线程池中逐批调用，使用当前线程复用的连接（由调用流程结束时 `close_thread_connections` 关闭）。
     """
-    conn = get_db_connection(db_path)
-    cur = conn.cursor()
-    
+    conn = thread_db_connection(db_path)
+
     try:
-        cur.execute(
-            """
-            INSERT INTO ai_responses (
-                batch_id, ai_provider, model_name, request_content, response_content, prompt_type
-            ) VALUES (?, ?, ?, ?, ?, ?)
-            """,
-            (batch_id, ai_provider, model_name, request_content, response_content, prompt_type)
+        insert_ai_responses_batch(
+            conn,
+            [(batch_id, ai_provider, model_name, request_content, response_content, prompt_type)],
         )
-        conn.commit()
     except Exception as e:
         logger.error(f"保存AI响应到数据库失败: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
 
 
 __all__ = ["call_ai_api_batch_for_relevance", "save_api_response"]
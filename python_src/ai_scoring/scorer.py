@@ -2,7 +2,8 @@
 from __future__ import annotations
 
 import re
-from typing import Dict, List, Tuple
+from itertools import islice
+from typing import Dict, Iterable, List, Tuple
 import os
 
 from python_src.config import DEFAULT_AI_CONFIGS, AI_SCORING_BATCH_SIZE, AI_SCORING_MAX_CHARS_PER_NOTE, AI_SCORING_MAX_TOTAL_CHARS
@@ -10,49 +11,14 @@ from python_src.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
-# ---------------------------------------------------------------------------
-# 构建批量请求
-# ---------------------------------------------------------------------------
+# 评分提取用的正则与查找表，模块加载时构建一次
+_CLEAN_CSV_RE = re.compile(r"^(\d+,)*\d+$", re.ASCII)  # 全角数字交给下方正则回退处理
+_SCORE_BY_TOKEN: Dict[str, int] = {str(i): i for i in range(11)}
+_WORD_SCORE_RE = re.compile(r"\b(10|[0-9])\b")
+_COMMA_SCORE_RE = re.compile(r"(\d+)(?:,|$)")
 
-def build_ai_batch_request(
-    ai_provider: str,
-    model_name: str,
-    api_key: str,
-    prompt_pairs: List[Dict],
-    max_content_length: int,
-    custom_scoring_prompt: str = None,
-    max_pairs: int = None,
-    max_chars_per_note: int = None,
-    max_total_chars: int = None,
-) -> Tuple[List | Dict, Dict, str]:
-    """根据 provider 构造 headers / body / url。
-    
-    优化为批量请求模式，减少重复发送评分标准。
-
-    Args:
-        ai_provider: AI提供商名称
-        model_name: 模型名称
-        api_key: API密钥
-        prompt_pairs: 需要评分的内容对列表
-        max_content_length: 最大内容长度
-        custom_scoring_prompt: 自定义评分提示词
-        max_pairs: 每次请求最多处理的笔记对数，默认为配置中的值
-        max_chars_per_note: 每个笔记最大字符数，默认为配置中的值
-        max_total_chars: 每个请求最大总字符数，默认为配置中的值
-        
-    返回 (data, headers, api_url)。"""
-    # 使用默认配置或传入参数
-    max_pairs = max_pairs or AI_SCORING_BATCH_SIZE
-    single_note_limit = min(max_chars_per_note or AI_SCORING_MAX_CHARS_PER_NOTE, max_content_length)
-    max_total_length = max_total_chars or AI_SCORING_MAX_TOTAL_CHARS
-    
-    # 限制单个笔记内容长度和批量处理的对数
-    if len(prompt_pairs) > max_pairs:
-        prompt_pairs = prompt_pairs[:max_pairs]
-        logger.info(f"批量请求超出限制，截取前{max_pairs}对内容进行处理")
-    
-    # 使用自定义提示词或默认提示词
-    scoring_guide = custom_scoring_prompt.strip() if custom_scoring_prompt else """
+# 默认评分标准（未提供自定义提示词时使用），模块加载时构建一次
+_DEFAULT_SCORING_GUIDE = """
     作为笔记关联性评分专家，请评估以下多对内容的关联度。这些内容可能包括知识笔记、诗歌创作、灵感片段、散文、情感记录等多样化形式。对每对内容给出0-10的整数评分，基于以下全面标准：
 
     【评分标准：】
@@ -95,237 +61,272 @@ def build_ai_batch_request(
     请只回复一个0-10的整数评分，不要有任何解释或额外文字！
     """.strip()
 
-    if ai_provider == "deepseek":
-        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
-        api_url = DEFAULT_AI_CONFIGS["deepseek"]["api_url"]
-        
-        # 优化：构建一个批量请求
-        if len(prompt_pairs) > 0:
-            # 构建多对内容的批量提示
-            content_pairs_text = ""
-            total_length = 0
-            
-            for idx, pair in enumerate(prompt_pairs):
-                source_content = pair['source_content'][:single_note_limit]
-                target_content = pair['target_content'][:single_note_limit]
-                
-                pair_text = f"[内容对 {idx+1}]\n内容一：{pair['source_name']}\n{source_content}\n\n内容二：{pair['target_name']}\n{target_content}\n\n"
-                pair_length = len(pair_text)
-                
-                # 检查添加这对内容是否会超出总字数限制
-                if total_length + pair_length > max_total_length:
-                    logger.info(f"已达到最大总字数限制({max_total_length}字)，只处理前{idx}对内容")
-                    break
-                
-                content_pairs_text += pair_text
-                total_length += pair_length
-            
-            # 修复DeepSeek请求格式，确保符合API规范
-            system_prompt = "你是善于发现内容关联的评分专家。请按顺序为每对内容提供0-10的整数评分。"
-            user_prompt = f"{scoring_guide}\n\n以下是需要评分的多对内容，请按顺序为每对内容提供一个0-10的整数评分，用逗号分隔每个分数。\n\n{content_pairs_text}\n请回复格式为：'分数1,分数2,分数3...'（仅包含数字和逗号，不要有其他文字）"
-            
-            batch_request = {
-                "model": model_name,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                "max_tokens": 5000,
-                "temperature": 0.7,
-            }
-            return [batch_request], headers, api_url
-        
-        # 如果没有内容对，返回空数组
-        return [], headers, api_url
+# ---------------------------------------------------------------------------
+# 构建批量请求
+# ---------------------------------------------------------------------------
 
-    if ai_provider == "openai":
-        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
-        api_url = DEFAULT_AI_CONFIGS["openai"]["api_url"]
-        
-        # 优化：构建一个批量请求
-        if len(prompt_pairs) > 0:
-            # 构建多对内容的批量提示
-            content_pairs_text = ""
-            total_length = 0
-            
-            for idx, pair in enumerate(prompt_pairs):
-                source_content = pair['source_content'][:single_note_limit]
-                target_content = pair['target_content'][:single_note_limit]
-                
-                pair_text = f"[内容对 {idx+1}]\n内容一：{pair['source_name']}\n{source_content}\n\n内容二：{pair['target_name']}\n{target_content}\n\n"
-                pair_length = len(pair_text)
-                
-                # 检查添加这对内容是否会超出总字数限制
-                if total_length + pair_length > max_total_length:
-                    logger.info(f"已达到最大总字数限制({max_total_length}字)，只处理前{idx}对内容")
-                    break
-                
-                content_pairs_text += pair_text
-                total_length += pair_length
-            
-            batch_request = {
-                "model": model_name,
-                "messages": [
-                    {"role": "system", "content": "你是善于发现内容关联的评分专家。请按顺序为每对内容提供0-10的整数评分。"},
-                    {"role": "user", "content": f"{scoring_guide}\n\n以下是需要评分的多对内容，请按顺序为每对内容提供一个0-10的整数评分，用逗号分隔每个分数。\n\n{content_pairs_text}\n请回复格式为：'分数1,分数2,分数3...'（仅包含数字和逗号，不要有其他文字）"}
-                ],
-                "max_tokens": 10000,
-                "temperature": 0.7,
-            }
-            return [batch_request], headers, api_url
-            
-        # 如果没有内容对，返回空数组
-        return [], headers, api_url
-
-    if ai_provider == "claude":
-        headers = {
-            "x-api-key": api_key,
-            "content-type": "application/json",
-            "anthropic-version": "2023-06-01",
-        }
-        api_url = DEFAULT_AI_CONFIGS["claude"]["api_url"]
-        
-        # 优化：构建一个批量请求
-        if len(prompt_pairs) > 0:
-            # 构建多对内容的批量提示
-            content_pairs_text = ""
-            total_length = 0
-            
-            for idx, pair in enumerate(prompt_pairs):
-                source_content = pair['source_content'][:single_note_limit]
-                target_content = pair['target_content'][:single_note_limit]
-                
-                pair_text = f"[内容对 {idx+1}]\n内容一：{pair['source_name']}\n{source_content}\n\n内容二：{pair['target_name']}\n{target_content}\n\n"
-                pair_length = len(pair_text)
-                
-                # 检查添加这对内容是否会超出总字数限制
-                if total_length + pair_length > max_total_length:
-                    logger.info(f"已达到最大总字数限制({max_total_length}字)，只处理前{idx}对内容")
-                    break
-                
-                content_pairs_text += pair_text
-                total_length += pair_length
-            
-            batch_request = {
-                "model": model_name,
-                "max_tokens": 10000,
-                "system": "你是善于发现内容关联的评分专家。请按顺序为每对内容提供0-10的整数评分，用逗号分隔，不要有多余文字。",
-                "messages": [
-                    {"role": "user", "content": f"{scoring_guide}\n\n以下是需要评分的多对内容，请按顺序为每对内容提供一个0-10的整数评分，用逗号分隔每个分数。\n\n{content_pairs_text}\n请回复格式为：'分数1,分数2,分数3...'（仅包含数字和逗号，不要有其他文字）"}
-                ],
-                "temperature": 0.7,
-            }
-            return [batch_request], headers, api_url
-            
-        # 如果没有内容对，返回空数组
-        return [], headers, api_url
-
-    if ai_provider == "gemini":
-        headers = {"Content-Type": "application/json"}
-        api_url_root = DEFAULT_AI_CONFIGS["gemini"]["api_url"]
-        
-        # 优化：构建一个批量请求
-        if len(prompt_pairs) > 0:
-            # 构建多对内容的批量提示
-            content_pairs_text = ""
-            total_length = 0
-            
-            for idx, pair in enumerate(prompt_pairs):
-                source_content = pair['source_content'][:single_note_limit]
-                target_content = pair['target_content'][:single_note_limit]
-                
-                pair_text = f"[内容对 {idx+1}]\n内容一：{pair['source_name']}\n{source_content}\n\n内容二：{pair['target_name']}\n{target_content}\n\n"
-                pair_length = len(pair_text)
-                
-                # 检查添加这对内容是否会超出总字数限制
-                if total_length + pair_length > max_total_length:
-                    logger.info(f"已达到最大总字数限制({max_total_length}字)，只处理前{idx}对内容")
-                    break
-                
-                content_pairs_text += pair_text
-                total_length += pair_length
-            
-            # 修改Gemini请求格式，明确指示输出数字
-            system_prompt = "你是一位善于发现内容关联的评分专家，需要对内容对进行0-10分评分。只回复逗号分隔的数字，不要有其他文字。"
-            user_prompt = f"{scoring_guide}\n\n以下是需要评分的多对内容，请按顺序为每对内容提供一个0-10的整数评分。\n\n{content_pairs_text}\n请直接回复逗号分隔的数字序列，例如：'8,6,9,3,7'，不要有任何额外文字或标点符号。"
-            
-            batch_request = {
-                "contents": [
+def _build_content_pairs_text(
+    prompt_pairs: Iterable[Dict],
+    single_note_limit: int,
+    max_total_length: int,
+) -> str:
+    """拼接批量评分提示中的多对内容文本，超出总字数限制时截断。
+
+    每对内容只在这里截取一次 ``single_note_limit`` 字符，各 provider 分支共用结果。"""
+    sliced_pairs = [
+        (pair["source_name"], pair["source_content"][:single_note_limit],
+         pair["target_name"], pair["target_content"][:single_note_limit])
+        for pair in prompt_pairs
+    ]
+
+    parts: List[str] = []
+    total_length = 0
+    for idx, (source_name, source_content, target_name, target_content) in enumerate(sliced_pairs):
+        pair_text = f"[内容对 {idx+1}]\n内容一：{source_name}\n{source_content}\n\n内容二：{target_name}\n{target_content}\n\n"
+        pair_length = len(pair_text)
+
+        # 检查添加这对内容是否会超出总字数限制
+        if total_length + pair_length > max_total_length:
+            logger.info(f"已达到最大总字数限制({max_total_length}字)，只处理前{idx}对内容")
+            break
+
+        parts.append(pair_text)
+        total_length += pair_length
+    return "".join(parts)
+
+
+def _scoring_user_prompt(scoring_guide: str, content_pairs_text: str) -> str:
+    """OpenAI 兼容接口与 Claude 共用的用户提示。"""
+    return f"{scoring_guide}\n\n以下是需要评分的多对内容，请按顺序为每对内容提供一个0-10的整数评分，用逗号分隔每个分数。\n\n{content_pairs_text}\n请回复格式为：'分数1,分数2,分数3...'（仅包含数字和逗号，不要有其他文字）"
+
+
+def _build_deepseek_payload(model_name: str, scoring_guide: str, content_pairs_text: str) -> Dict:
+    # 修复DeepSeek请求格式，确保符合API规范
+    return {
+        "model": model_name,
+        "messages": [
+            {"role": "system", "content": "你是善于发现内容关联的评分专家。请按顺序为每对内容提供0-10的整数评分。"},
+            {"role": "user", "content": _scoring_user_prompt(scoring_guide, content_pairs_text)},
+        ],
+        "max_tokens": 5000,
+        "temperature": 0.7,
+    }
+
+
+def _build_openai_payload(model_name: str, scoring_guide: str, content_pairs_text: str) -> Dict:
+    return {
+        "model": model_name,
+        "messages": [
+            {"role": "system", "content": "你是善于发现内容关联的评分专家。请按顺序为每对内容提供0-10的整数评分。"},
+            {"role": "user", "content": _scoring_user_prompt(scoring_guide, content_pairs_text)},
+        ],
+        "max_tokens": 10000,
+        "temperature": 0.7,
+    }
+
+
+def _build_claude_payload(model_name: str, scoring_guide: str, content_pairs_text: str) -> Dict:
+    return {
+        "model": model_name,
+        "max_tokens": 10000,
+        "system": "你是善于发现内容关联的评分专家。请按顺序为每对内容提供0-10的整数评分，用逗号分隔，不要有多余文字。",
+        "messages": [
+            {"role": "user", "content": _scoring_user_prompt(scoring_guide, content_pairs_text)},
+        ],
+        "temperature": 0.7,
+    }
+
+
+def _build_gemini_payload(model_name: str, scoring_guide: str, content_pairs_text: str) -> Dict:
+    # 修改Gemini请求格式，明确指示输出数字
+    system_prompt = "你是一位善于发现内容关联的评分专家，需要对内容对进行0-10分评分。只回复逗号分隔的数字，不要有其他文字。"
+    user_prompt = f"{scoring_guide}\n\n以下是需要评分的多对内容，请按顺序为每对内容提供一个0-10的整数评分。\n\n{content_pairs_text}\n请直接回复逗号分隔的数字序列，例如：'8,6,9,3,7'，不要有任何额外文字或标点符号。"
+    return {
+        "contents": [
+            {
+                "role": "user",
+                "parts": [
                     {
-                        "role": "user",
-                        "parts": [
-                            {
-                                "text": user_prompt
-                            }
-                        ]
+                        "text": user_prompt
                     }
-                ],
-                "systemInstruction": {
-                    "role": "system",
-                    "parts": [{"text": system_prompt}]
-                },
-                "generationConfig": {"temperature": 0.7, "maxOutputTokens": 5000},
+                ]
             }
-            return [batch_request], headers, api_url_root
-            
-        # 如果没有内容对，返回空数组
-        return [], headers, api_url_root
+        ],
+        "systemInstruction": {
+            "role": "system",
+            "parts": [{"text": system_prompt}]
+        },
+        "generationConfig": {"temperature": 0.7, "maxOutputTokens": 5000},
+    }
 
-    # custom provider (assumed OpenAI-like)
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
-    
-    # 优化：构建一个批量请求
-    if len(prompt_pairs) > 0:
-        # 构建多对内容的批量提示
-        content_pairs_text = ""
-        total_length = 0
-        
-        for idx, pair in enumerate(prompt_pairs):
-            source_content = pair['source_content'][:single_note_limit]
-            target_content = pair['target_content'][:single_note_limit]
-            
-            pair_text = f"[内容对 {idx+1}]\n内容一：{pair['source_name']}\n{source_content}\n\n内容二：{pair['target_name']}\n{target_content}\n\n"
-            pair_length = len(pair_text)
-            
-            # 检查添加这对内容是否会超出总字数限制
-            if total_length + pair_length > max_total_length:
-                logger.info(f"已达到最大总字数限制({max_total_length}字)，只处理前{idx}对内容")
-                break
-            
-            content_pairs_text += pair_text
-            total_length += pair_length
-        
+
+def _build_custom_payload(model_name: str, scoring_guide: str, content_pairs_text: str | None) -> Dict:
+    # custom provider (assumed OpenAI-like)；content_pairs_text 为 None 表示没有内容对
+    messages_array = []
+    if content_pairs_text is not None:
         messages_array = [
             [
                 {
                     "role": "user",
-                    "content": f"{scoring_guide}\n\n以下是需要评分的多对内容，请按顺序为每对内容提供一个0-10的整数评分，用逗号分隔每个分数。\n\n{content_pairs_text}\n请回复格式为：'分数1,分数2,分数3...'（仅包含数字和逗号，不要有其他文字）"
+                    "content": _scoring_user_prompt(scoring_guide, content_pairs_text),
                 }
             ]
         ]
-        
-        data = {
-            "model": model_name,
-            "messages_list": messages_array,
-            "max_tokens": 100,
-            "temperature": 1.0,
-        }
-        return data, headers, DEFAULT_AI_CONFIGS["custom"]["api_url"]
-        
-    # 如果没有内容对，返回空对象
-    data = {
+    return {
         "model": model_name,
-        "messages_list": [],
+        "messages_list": messages_array,
         "max_tokens": 100,
         "temperature": 1.0,
     }
-    return data, headers, DEFAULT_AI_CONFIGS["custom"]["api_url"]
+
+
+def _bearer_auth(api_key: str) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {api_key}"}
+
+
+# provider -> 静态 headers / 鉴权头 / 接口地址 / 请求体构造函数，模块加载时构建一次。
+# as_list=True 的 provider 返回只含一个请求项的列表；自定义 provider 直接返回请求字典。
+_PROVIDER_TABLE: Dict[str, Dict] = {
+    "deepseek": {
+        "headers": {"Content-Type": "application/json"},
+        "auth": _bearer_auth,
+        "url": DEFAULT_AI_CONFIGS["deepseek"]["api_url"],
+        "build_payload": _build_deepseek_payload,
+        "as_list": True,
+    },
+    "openai": {
+        "headers": {"Content-Type": "application/json"},
+        "auth": _bearer_auth,
+        "url": DEFAULT_AI_CONFIGS["openai"]["api_url"],
+        "build_payload": _build_openai_payload,
+        "as_list": True,
+    },
+    "claude": {
+        "headers": {"content-type": "application/json", "anthropic-version": "2023-06-01"},
+        "auth": lambda api_key: {"x-api-key": api_key},
+        "url": DEFAULT_AI_CONFIGS["claude"]["api_url"],
+        "build_payload": _build_claude_payload,
+        "as_list": True,
+    },
+    "gemini": {
+        # gemini 的 key 由调用方拼接到 URL 中
+        "headers": {"Content-Type": "application/json"},
+        "auth": lambda api_key: {},
+        "url": DEFAULT_AI_CONFIGS["gemini"]["api_url"],
+        "build_payload": _build_gemini_payload,
+        "as_list": True,
+    },
+    "custom": {
+        "headers": {"Content-Type": "application/json"},
+        "auth": _bearer_auth,
+        "url": DEFAULT_AI_CONFIGS["custom"]["api_url"],
+        "build_payload": _build_custom_payload,
+        "as_list": False,
+    },
+}
+
+
+def build_ai_batch_request(
+    ai_provider: str,
+    model_name: str,
+    api_key: str,
+    prompt_pairs: List[Dict],
+    max_content_length: int,
+    custom_scoring_prompt: str = None,
+    max_pairs: int = None,
+    max_chars_per_note: int = None,
+    max_total_chars: int = None,
+) -> Tuple[List | Dict, Dict, str]:
+    """根据 provider 构造 headers / body / url。
+    
+    优化为批量请求模式，减少重复发送评分标准。
+
+    Args:
+        ai_provider: AI提供商名称
+        model_name: 模型名称
+        api_key: API密钥
+        prompt_pairs: 需要评分的内容对列表
+        max_content_length: 最大内容长度
+        custom_scoring_prompt: 自定义评分提示词
+        max_pairs: 每次请求最多处理的笔记对数，默认为配置中的值
+        max_chars_per_note: 每个笔记最大字符数，默认为配置中的值
+        max_total_chars: 每个请求最大总字符数，默认为配置中的值
+        
+    返回 (data, headers, api_url)。"""
+    # 使用默认配置或传入参数
+    max_pairs = max_pairs or AI_SCORING_BATCH_SIZE
+    single_note_limit = min(max_chars_per_note or AI_SCORING_MAX_CHARS_PER_NOTE, max_content_length)
+    max_total_length = max_total_chars or AI_SCORING_MAX_TOTAL_CHARS
+    
+    # 限制单个笔记内容长度和批量处理的对数（由 _build_content_pairs_text 通过 islice 截取，不复制列表）
+    if len(prompt_pairs) > max_pairs:
+        logger.info(f"批量请求超出限制，截取前{max_pairs}对内容进行处理")
+    
+    # 使用自定义提示词或默认提示词
+    scoring_guide = custom_scoring_prompt.strip() if custom_scoring_prompt else _DEFAULT_SCORING_GUIDE
+
+    cfg = _PROVIDER_TABLE.get(ai_provider, _PROVIDER_TABLE["custom"])
+    headers = dict(cfg["headers"])
+    headers.update(cfg["auth"](api_key))
+    api_url = cfg["url"]
+
+    # 如果没有内容对：标准 provider 返回空数组，自定义 provider 返回空请求对象
+    if not prompt_pairs:
+        if cfg["as_list"]:
+            return [], headers, api_url
+        return cfg["build_payload"](model_name, scoring_guide, None), headers, api_url
+
+    # 优化：构建一个批量请求
+    content_pairs_text = _build_content_pairs_text(islice(prompt_pairs, max_pairs), single_note_limit, max_total_length)
+    batch_request = cfg["build_payload"](model_name, scoring_guide, content_pairs_text)
+    if cfg["as_list"]:
+        return [batch_request], headers, api_url
+    return batch_request, headers, api_url
 
 
 # ---------------------------------------------------------------------------
 # 解析响应
 # ---------------------------------------------------------------------------
 
+def extract_response_text(ai_provider: str, response_data: Dict) -> str | None:
+    """按 provider 的响应结构取出模型回复文本，结构不符时返回 None。
+
+    直接索引、只在异常路径上兜底，避免 ``.get("choices", [{}])`` 链每次构造默认对象。"""
+    try:
+        if ai_provider == "claude":
+            return response_data["content"][0]["text"]
+        if ai_provider == "gemini":
+            # 处理新旧两种格式的Gemini API响应
+            candidate = response_data["candidates"][0]
+            content_obj = candidate.get("content") or {}
+            # 新格式: candidates[0].content.text 直接包含文本
+            if "text" in content_obj:
+                return content_obj["text"]
+            # 新格式: candidates[0].text 直接包含文本
+            if "text" in candidate:
+                return candidate["text"]
+            # 旧格式: candidates[0].content.parts[0].text
+            return content_obj["parts"][0]["text"]
+        # openai / deepseek / custom 均为 OpenAI 兼容格式
+        return response_data["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+# 各 provider 响应中必须存在的顶层字段，缺失时视为无效响应
+_RESPONSE_ROOT_KEYS: Dict[str, str] = {"claude": "content", "gemini": "candidates"}
+
+
+def _warn_unscored_pairs(ai_provider: str, prompt_pairs: List[Dict]) -> None:
+    """响应中取不到回复文本时记录未评分的笔记对（不写 0 分，下次运行会重新发送）。"""
+    logger.warning(
+        "%s 响应中没有回复文本，以下 %d 对笔记未评分，将在下次运行时重试: %s",
+        ai_provider,
+        len(prompt_pairs),
+        ", ".join(f"{pair['source_path']} ↔ {pair['target_path']}" for pair in prompt_pairs),
+    )
+
+
 def parse_ai_batch_response(
     ai_provider: str,
     response_data: Dict | List,
@@ -342,127 +343,29 @@ def parse_ai_batch_response(
         return results
 
     try:
-        # 解析批量评分结果
-        if ai_provider == "deepseek":
-            if not response_data or "choices" not in response_data:
-                return results
-                
-            # 获取批量评分返回的内容
-            content = response_data.get("choices", [{}])[0].get("message", {}).get("content", "")
-            # 解析逗号分隔的分数
-            scores = extract_scores_from_text(content, len(prompt_pairs))
-            
-            # 为每对内容生成结果
-            for idx, pair in enumerate(prompt_pairs):
-                if idx < len(scores):
-                    results.append(
-                        {
-                            "source_path": pair["source_path"],
-                            "target_path": pair["target_path"],
-                            "ai_score": scores[idx] or 0,
-                            "jina_similarity": pair.get("jina_similarity", 0),
-                        }
-                    )
-            
-        elif ai_provider == "openai":
-            if not response_data or "choices" not in response_data:
-                return results
-                
-            # 获取批量评分返回的内容
-            content = response_data.get("choices", [{}])[0].get("message", {}).get("content", "")
-            # 解析逗号分隔的分数
-            scores = extract_scores_from_text(content, len(prompt_pairs))
-            
-            # 为每对内容生成结果
-            for idx, pair in enumerate(prompt_pairs):
-                if idx < len(scores):
-                    results.append(
-                        {
-                            "source_path": pair["source_path"],
-                            "target_path": pair["target_path"],
-                            "ai_score": scores[idx] or 0,
-                            "jina_similarity": pair.get("jina_similarity", 0),
-                        }
-                    )
-
-        elif ai_provider == "claude":
-            if not response_data or "content" not in response_data:
-                return results
-                
-            # 获取批量评分返回的内容
-            content = response_data.get("content", [{}])[0].get("text", "") if response_data else ""
-            # 解析逗号分隔的分数
-            scores = extract_scores_from_text(content, len(prompt_pairs))
-            
-            # 为每对内容生成结果
-            for idx, pair in enumerate(prompt_pairs):
-                if idx < len(scores):
-                    results.append(
-                        {
-                            "source_path": pair["source_path"],
-                            "target_path": pair["target_path"],
-                            "ai_score": scores[idx] or 0,
-                            "jina_similarity": pair.get("jina_similarity", 0),
-                        }
-                    )
-
-        elif ai_provider == "gemini":
-            if not response_data or "candidates" not in response_data:
-                return results
-                
-            # 获取批量评分返回的内容
-            content = ""
-            if response_data["candidates"]:
-                candidate = response_data["candidates"][0]
-                content_obj = candidate.get("content", {})
-                
-                # 新格式: candidates[0].content.text 直接包含文本
-                if "text" in content_obj:
-                    content = content_obj["text"]
-                # 新格式: candidates[0].text 直接包含文本
-                elif "text" in candidate:
-                    content = candidate["text"]
-                # 旧格式: candidates[0].content.parts[0].text
-                elif "parts" in content_obj:
-                    parts = content_obj.get("parts", [])
-                    if parts and "text" in parts[0]:
-                        content = parts[0]["text"]
-                    
-            # 解析逗号分隔的分数
-            scores = extract_scores_from_text(content, len(prompt_pairs))
-            
-            # 为每对内容生成结果
-            for idx, pair in enumerate(prompt_pairs):
-                if idx < len(scores):
-                    results.append(
-                        {
-                            "source_path": pair["source_path"],
-                            "target_path": pair["target_path"],
-                            "ai_score": scores[idx] or 0,
-                            "jina_similarity": pair.get("jina_similarity", 0),
-                        }
-                    )
-
-        else:  # custom provider
-            if not response_data or "choices" not in response_data:
-                return results
-                
-            # 获取批量评分返回的内容
-            content = response_data.get("choices", [{}])[0].get("message", {}).get("content", "")
-            # 解析逗号分隔的分数
-            scores = extract_scores_from_text(content, len(prompt_pairs))
-            
-            # 为每对内容生成结果
-            for idx, pair in enumerate(prompt_pairs):
-                if idx < len(scores):
-                    results.append(
-                        {
-                            "source_path": pair["source_path"],
-                            "target_path": pair["target_path"],
-                            "ai_score": scores[idx] or 0,
-                            "jina_similarity": pair.get("jina_similarity", 0),
-                        }
-                    )
+        if not response_data or _RESPONSE_ROOT_KEYS.get(ai_provider, "choices") not in response_data:
+            _warn_unscored_pairs(ai_provider, prompt_pairs)
+            return results
+
+        # 获取批量评分返回的内容
+        content = extract_response_text(ai_provider, response_data)
+        if content is None:
+            logger.error("%s 响应结构不完整，无法提取评分: %.200s", ai_provider, response_data)
+            _warn_unscored_pairs(ai_provider, prompt_pairs)
+            return results
+        # 解析逗号分隔的分数
+        scores = extract_scores_from_text(content, len(prompt_pairs))
+
+        # 为每对内容生成结果
+        for pair, score in zip(prompt_pairs, scores):
+            results.append(
+                {
+                    "source_path": pair["source_path"],
+                    "target_path": pair["target_path"],
+                    "ai_score": score,
+                    "jina_similarity": pair.get("jina_similarity", 0),
+                }
+            )
 
     except Exception as exc:  # pylint: disable=broad-except
         logger.error("解析 %s 响应失败: %s", ai_provider, exc)
@@ -495,7 +398,7 @@ def extract_score_from_text(text: str) -> int | None:
     return None
 
 
-def extract_scores_from_text(text: str, expected_count: int) -> List[int | None]:
+def extract_scores_from_text(text: str, expected_count: int) -> List[int]:
     """从文本中提取多个逗号分隔的 0-10 整数评分。
     
     Args:
@@ -503,57 +406,39 @@ def extract_scores_from_text(text: str, expected_count: int) -> List[int | None]
         expected_count: 期望的评分数量
         
     Returns:
-        列表，包含提取出的整数评分，如果某项无法提取则为None
+        长度恰好为 expected_count 的整数评分列表（不含 None）；
+        无法提取或超出范围的项均为 0，调用方无需再做 None 处理
     """
-    scores = []
-    
     # 首先尝试最简单的情况：文本就是逗号分隔的数字列表
-    clean_text = text.strip().replace(" ", "")
-    if re.match(r'^(\d+,)*\d+$', clean_text):
-        try:
-            # 直接分割并转换为整数
-            for num_str in clean_text.split(','):
-                num = int(num_str)
-                if 0 <= num <= 10:
-                    scores.append(num)
-                else:
-                    scores.append(0)  # 超出范围的数字设为0
-            
-            # 如果找到的分数达到预期，直接返回
-            if len(scores) == expected_count:
-                return scores
-        except ValueError:
-            # 如果有任何转换错误，继续使用正则表达式方法
-            pass
+    # 逐项查表代替 int() + 范围判断；超出 0-10 范围的数字设为0
+    # 一次 C 层 split/join 去掉所有空白（含换行、制表符），使 "8,\n6" 之类的回复也能走快速路径
+    clean_text = "".join(text.split())
+    if _CLEAN_CSV_RE.match(clean_text):
+        tokens = clean_text.split(",")
+        # 如果找到的分数达到预期，直接返回
+        if len(tokens) == expected_count:
+            return [_SCORE_BY_TOKEN.get(t.lstrip("0") or "0", 0) for t in tokens]
     
     # 如果简单方法失败，使用更强大的正则表达式
+    scores = []
     try:
-        # 改进正则表达式以匹配数字
         # 匹配模式:
         # 1. 独立的数字 (使用\b边界)
         # 2. 特别优先匹配10 (因为它是两位数)
         # 3. 然后匹配0-9的单个数字
-        scores_matches = re.findall(r'\b(10|[0-9])\b', text)
-        
+        # 该模式只会匹配 0-10，无需再做范围检查；找到预期数量后立即停止扫描
+        for match in _WORD_SCORE_RE.finditer(text):
+            scores.append(int(match.group(1)))
+            if len(scores) == expected_count:
+                break
+
         # 补充尝试匹配逗号分隔的形式
-        if not scores_matches:
-            comma_matches = re.findall(r'(\d+)(?:,|$)', text)
-            if comma_matches:
-                scores_matches = comma_matches
-        
-        for match in scores_matches:
-            try:
-                score = int(match)
-                if 0 <= score <= 10:
-                    scores.append(score)
-                else:
-                    scores.append(0)  # 超出范围的数字设为0
-                    
-                # 如果已经找到预期数量的分数，就提前停止
+        if not scores:
+            for match in _COMMA_SCORE_RE.finditer(text):
+                score = int(match.group(1))
+                scores.append(score if 0 <= score <= 10 else 0)  # 超出范围的数字设为0
                 if len(scores) == expected_count:
                     break
-            except (ValueError, TypeError):
-                continue # 如果转换失败，跳过这个匹配项
                 
     except Exception as e:
         logger.error(f"从文本中提取分数时出错: '{text}'. 错误: {e}")
@@ -572,6 +457,7 @@ def extract_scores_from_text(text: str, expected_count: int) -> List[int | None]
 __all__ = [
     "build_ai_batch_request",
     "parse_ai_batch_response",
+    "extract_response_text",
     "extract_score_from_text",
     "extract_scores_from_text",
     ]
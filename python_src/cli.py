@@ -20,17 +20,23 @@ sys.path.insert(0, parent_dir)
 from python_src.config import (
     DEFAULT_MAIN_DB_FILE_NAME,
     DEFAULT_SIMILARITY_THRESHOLD,
+    EMBEDDING_BATCH_SIZE,
+    JINA_CONCURRENCY,
+    JINA_TARGET_QPM,
     AI_SCORING_BATCH_SIZE,
+    AI_SCORING_CONCURRENCY,
     AI_SCORING_MAX_CHARS_PER_NOTE,
     AI_SCORING_MAX_TOTAL_CHARS,
+    AI_REQUEST_BURST,
+    AI_TARGET_QPM,
 )
 from python_src.db.schema import MAIN_DB_SCHEMA
-from python_src.embeddings.similarity import generate_candidate_pairs
-from python_src.io.note_loader import list_markdown_files
 from python_src.io.output_writer import export_ai_scores_to_json, export_ai_tags_to_json
-from python_src.orchestrator.embed_pipeline import process_and_embed_notes
-from python_src.orchestrator.link_scoring import score_candidates
-from python_src.utils.db import initialize_database, list_database_tables, get_db_connection
+from python_src.utils.db import (
+    initialize_database,
+    insert_ai_responses_batch,
+    shared_db_connection,
+)
 from python_src.utils.logger import init_logger, get_logger
 from python_src.hash_utils.hasher import HASH_BOUNDARY_MARKER
 # 不再需要旧版 SQLite 迁移逻辑, 已移除
@@ -63,8 +69,19 @@ def build_arg_parser() -> argparse.ArgumentParser:
     p.add_argument("--excluded_folders", nargs="*", default=[])
     p.add_argument("--excluded_files_patterns", nargs="*", default=[])
 
-    p.add_argument("--embedding_batch_size", type=int, default=10)
+    p.add_argument("--embedding_batch_size", type=int, default=EMBEDDING_BATCH_SIZE,
+                   help="每次 Jina 请求最多包含的笔记数（同时受总字符数限制）")
+    p.add_argument("--jina_concurrency", type=int, default=JINA_CONCURRENCY,
+                   help="同时进行中的 Jina 嵌入请求数（1 表示串行）")
+    p.add_argument("--jina_target_qpm", type=float, default=JINA_TARGET_QPM,
+                   help="Jina 请求总速率上限（次/分钟，0 表示不限速；429 时仍会整体退避）")
     p.add_argument("--ai_scoring_batch_size", type=int, default=AI_SCORING_BATCH_SIZE)
+    p.add_argument("--ai_concurrency", type=int, default=AI_SCORING_CONCURRENCY,
+                   help="同时进行中的 AI 评分批量请求数（1 表示串行）")
+    p.add_argument("--ai_target_qpm", type=float, default=AI_TARGET_QPM,
+                   help="AI 请求总速率上限（次/分钟，评分与标签共用，0 表示不限速）")
+    p.add_argument("--ai_request_burst", type=int, default=AI_REQUEST_BURST,
+                   help="达到速率上限前允许连续发出的 AI 请求数")
     p.add_argument("--max_chars_per_note", type=int, default=AI_SCORING_MAX_CHARS_PER_NOTE,
                    help="每个笔记在AI评分时的最大字符数")
     p.add_argument("--max_total_chars_per_request", type=int, default=AI_SCORING_MAX_TOTAL_CHARS,
@@ -81,6 +98,10 @@ def build_arg_parser() -> argparse.ArgumentParser:
     p.add_argument("--export_json", action="store_true", help="导出AI评分数据到JSON")
     p.add_argument("--export_json_only", action="store_true", help="仅导出AI评分数据到JSON，不执行其他处理")
     p.add_argument("--no_export_json", action="store_true", help="不导出AI评分数据到JSON")
+    p.add_argument("--export_format", choices=["json", "ndjson"], default="json",
+                   help="AI评分导出格式: json=按源笔记分组的 ai_scores.json, ndjson=逐行流式导出 ai_scores.ndjson")
+    p.add_argument("--pretty_json", action="store_true",
+                   help="导出的 ai_scores.json / ai_tags.json 使用缩进格式（默认紧凑格式）")
     # 标签生成
     p.add_argument("--tags_mode", choices=["force","smart","skip"], default="skip",
                    help="AI 标签生成模式: force=重新生成, smart=仅新笔记, skip=跳过")
@@ -108,191 +129,201 @@ def main() -> None:  # pragma: no cover
     os.makedirs(output_dir_abs, exist_ok=True)
 
     if args.export_json_only:
-        export_ai_scores_to_json(project_root_abs, output_dir_abs, min_score=args.min_ai_score)
+        export_ai_scores_to_json(
+            project_root_abs,
+            output_dir_abs,
+            min_score=args.min_ai_score,
+            export_format=args.export_format,
+            pretty=args.pretty_json,
+        )
         return
 
+    # 完整流程才需要的模块（依赖 numpy / requests / faiss）在此导入，
+    # 使插件频繁调用的 --export_json_only 无需承担这部分导入开销
+    from python_src.embeddings.similarity import generate_candidate_pairs
+    from python_src.io.note_loader import list_markdown_files
+    from python_src.orchestrator.embed_pipeline import process_and_embed_notes
+    from python_src.orchestrator.link_scoring import score_candidates
+    from python_src.orchestrator.tag_generation import generate_tags
+    from python_src.utils.rate_limiter import ai_api_limiter, jina_api_limiter
+
+    ai_api_limiter.configure(args.ai_target_qpm / 60, burst=args.ai_request_burst)
+    jina_api_limiter.configure(args.jina_target_qpm / 60, burst=args.jina_concurrency)
+
     main_db_path = os.path.join(output_dir_abs, DEFAULT_MAIN_DB_FILE_NAME)
 
     # 若数据库不存在则初始化结构
     initialize_database(main_db_path, MAIN_DB_SCHEMA)
 
-    # 不再输出所有表结构
-    # list_database_tables(main_db_path)
-
-    from python_src.utils.db import check_table_exists
-    missing_tables = []
-    for tbl in ("note_tags", "ai_responses"):
-        if not check_table_exists(main_db_path, tbl):
-            missing_tables.append(tbl)
-
-    if missing_tables:
-        logger.info("检测到缺失表 %s, 将更新数据库结构", ", ".join(missing_tables))
-        import sqlite3 as _sql
-        conn_fix = _sql.connect(main_db_path)
-        try:
-            conn_fix.executescript(MAIN_DB_SCHEMA)
-            conn_fix.commit()
-            logger.info("已执行 MAIN_DB_SCHEMA 以补齐缺失表")
-        finally:
-            conn_fix.close()
-
-    # 测试ai_responses表
-    if args.test_ai_responses_db:
-        # 减少日志输出
-        conn = get_db_connection(main_db_path)
-        try:
-            # 插入测试数据
-            test_batch_id = f"test_{int(time.time())}"
-            conn.execute(
-                """
-                INSERT INTO ai_responses (
-                    batch_id, ai_provider, model_name, request_content, response_content, prompt_type
-                ) VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (test_batch_id, "test", "test-model", "测试请求内容", "测试响应内容", "default")
-            )
-            conn.commit()
-
-            # 查询测试数据
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM ai_responses WHERE batch_id = ?", (test_batch_id,))
-            rows = cursor.fetchall()
-            if rows:
-                # 清理测试数据
-                conn.execute("DELETE FROM ai_responses WHERE batch_id = ?", (test_batch_id,))
-                conn.commit()
-                logger.info("测试ai_responses表成功")
-            else:
-                logger.error("测试ai_responses表失败")
-        except Exception as e:
-            logger.error(f"测试ai_responses表失败: {e}")
-        finally:
-            conn.close()
-        return
+    # 整个流程复用同一个连接（嵌入、评分、标签写库），结束时统一关闭
+    with shared_db_connection(main_db_path) as conn:
+        # 测试ai_responses表
+        if args.test_ai_responses_db:
+            # 减少日志输出
+            try:
+                conn.executescript(MAIN_DB_SCHEMA)
+                # 插入测试数据
+                test_batch_id = f"test_{int(time.time())}"
+                insert_ai_responses_batch(
+                    conn,
+                    [(test_batch_id, "test", "test-model", "测试请求内容", "测试响应内容", "default")],
+                )
+
+                # 查询测试数据
+                cursor = conn.cursor()
+                cursor.execute("SELECT * FROM ai_responses WHERE batch_id = ?", (test_batch_id,))
+                rows = cursor.fetchall()
+                if rows:
+                    # 清理测试数据
+                    conn.execute("DELETE FROM ai_responses WHERE batch_id = ?", (test_batch_id,))
+                    conn.commit()
+                    logger.info("测试ai_responses表成功")
+                else:
+                    logger.error("测试ai_responses表失败")
+            except Exception as e:
+                logger.error(f"测试ai_responses表失败: {e}")
+            return
+
+        scan_paths = []
+        if args.scan_target_folders:
+            for p in args.scan_target_folders:
+                path = os.path.join(project_root_abs, p)
+                # 检查是否为文件或目录
+                if os.path.isfile(path):
+                    # 如果是文件，直接添加
+                    scan_paths.append(path)
+                else:
+                    # 如果是目录，添加目录路径
+                    scan_paths.append(path)
+        else:
+            scan_paths = [project_root_abs]
 
-    scan_paths = []
-    if args.scan_target_folders:
-        for p in args.scan_target_folders:
-            path = os.path.join(project_root_abs, p)
-            # 检查是否为文件或目录
-            if os.path.isfile(path):
-                # 如果是文件，直接添加
-                scan_paths.append(path)
-            else:
-                # 如果是目录，添加目录路径
-                scan_paths.append(path)
-    else:
-        scan_paths = [project_root_abs]
-
-    # Scan markdown files
-    markdown_files: list[str] = []
-    for p in scan_paths:
-        markdown_files.extend(
-            list_markdown_files(
+        # Scan markdown files（直接汇入集合去重，避免同时持有中间列表与集合）
+        markdown_files: list[str] = sorted({
+            rel_path
+            for p in scan_paths
+            for rel_path in list_markdown_files(
                 p,
                 project_root_abs,
                 excluded_folders=args.excluded_folders,
                 excluded_files_patterns=args.excluded_files_patterns,
             )
-        )
-    markdown_files = sorted(set(markdown_files))
-    if not markdown_files:
-        logger.warning("未找到任何 Markdown 文件，流程结束。")
-        return
-
-    # ************ 修改开始 ************
-    # 1. 强制执行嵌入处理 - 这是所有功能的前置步骤
-    # 无论是标签生成还是AI评分，都需要先确保笔记已经嵌入并记录在数据库中
-    embeddings_data = {
-        "files": {}
-    }
-
-    if args.jina_api_key:
-        logger.info("开始执行嵌入处理（所有功能的前置步骤）...")
-        embeddings_data = process_and_embed_notes(
-            project_root_abs,
-            markdown_files,
-            main_db_path,
-            jina_api_key_to_use=args.jina_api_key,
-            jina_model_name_to_use=args.jina_model_name,
-            max_chars_for_jina_to_use=args.max_chars_for_jina,
-            embedding_batch_size=args.embedding_batch_size,
-        )
-        logger.info("嵌入处理完成，笔记已记录到数据库中")
-    else:
-        logger.error("必须提供 Jina API Key 才能执行嵌入处理。嵌入处理是所有功能（标签生成、AI评分）的前置步骤。")
-        logger.error("请设置 --jina_api_key 参数后重试。")
-        return
-    
-    # 2. 根据功能标志，选择性执行打分或标签生成功能
-    # 确保互相独立，不会交叉执行
-
-    # 2.1 执行AI评分功能（如果启用）
-    if args.ai_api_key and args.ai_scoring_mode != "skip":
-        logger.info("开始AI评分流程...")
-        
-        # 生成候选链接对（用于AI评分）
-        candidates = generate_candidate_pairs(embeddings_data, args.similarity_threshold) if embeddings_data.get("files") else []
-        logger.info(f"基于嵌入相似度生成了 {len(candidates)} 个候选链接对")
-        
-        if candidates:
-            score_candidates(
-                candidates,
+        })
+        if not markdown_files:
+            logger.warning("未找到任何 Markdown 文件，流程结束。")
+            return
+
+        # ************ 修改开始 ************
+        # 1. 强制执行嵌入处理 - 这是所有功能的前置步骤
+        # 无论是标签生成还是AI评分，都需要先确保笔记已经嵌入并记录在数据库中
+        embeddings_data = {
+            "files": {}
+        }
+
+        if args.jina_api_key:
+            # 只在确实要写库时补齐表结构：MAIN_DB_SCHEMA 全部为 IF NOT EXISTS，可为旧数据库补齐缺失的表/索引
+            conn.executescript(MAIN_DB_SCHEMA)
+            logger.info("开始执行嵌入处理（所有功能的前置步骤）...")
+            embeddings_data = process_and_embed_notes(
                 project_root_abs,
+                markdown_files,
                 main_db_path,
-                ai_provider=args.ai_provider,
-                ai_api_url=args.ai_api_url,
-                ai_api_key=args.ai_api_key,
-                ai_model_name=args.ai_model_name,
-                max_content_length_for_ai_to_use=args.max_content_length_for_ai,
-                force_rescore=(args.ai_scoring_mode == "force"),
-                ai_scoring_batch_size=args.ai_scoring_batch_size,
-                custom_scoring_prompt=args.custom_scoring_prompt,
-                use_custom_scoring_prompt=args.use_custom_scoring_prompt,
-                max_pairs_per_request=args.ai_scoring_batch_size,
-                max_chars_per_note=args.max_chars_per_note,
-                max_total_chars_per_request=args.max_total_chars_per_request,
-                save_api_responses=args.save_api_responses,
+                jina_api_key_to_use=args.jina_api_key,
+                jina_model_name_to_use=args.jina_model_name,
+                max_chars_for_jina_to_use=args.max_chars_for_jina,
+                embedding_batch_size=args.embedding_batch_size,
+                jina_concurrency=args.jina_concurrency,
+                conn=conn,
             )
-            logger.info("AI评分流程完成")
-        else:
-            logger.warning("没有足够的候选链接对，跳过AI评分流程")
-    elif not args.ai_api_key:
-        logger.warning("未提供 AI API Key, 跳过 AI 评分阶段。")
-
-    # 导出AI评分JSON（如果需要）
-    if not args.no_export_json or args.export_json:
-        export_ai_scores_to_json(project_root_abs, output_dir_abs, min_score=args.min_ai_score)
-
-    # 2.2 AI标签生成阶段（如果启用）
-    if args.tags_mode != "skip":
-        if not args.ai_api_key:
-            logger.warning("未提供 AI API Key, 跳过标签生成阶段。")
+            logger.info("嵌入处理完成，笔记已记录到数据库中")
         else:
-            logger.info("开始AI标签生成阶段（模式：%s）...", args.tags_mode)
-            from python_src.orchestrator.tag_generation import generate_tags  # 局部导入避免循环
-            generate_tags(
+            logger.error("必须提供 Jina API Key 才能执行嵌入处理。嵌入处理是所有功能（标签生成、AI评分）的前置步骤。")
+            logger.error("请设置 --jina_api_key 参数后重试。")
+            return
+
+        # 2. 根据功能标志，选择性执行打分或标签生成功能
+        # 确保互相独立，不会交叉执行
+
+        # 2.1 执行AI评分功能（如果启用）
+        if args.ai_api_key and args.ai_scoring_mode != "skip":
+            logger.info("开始AI评分流程...")
+
+            # 生成候选链接对（用于AI评分）
+            candidates = generate_candidate_pairs(
+                embeddings_data,
+                args.similarity_threshold,
+                max_candidates_per_source=args.max_candidates_per_source_for_ai_scoring,
+            ) if embeddings_data.get("files") else []
+            logger.info(f"基于嵌入相似度生成了 {len(candidates)} 个候选链接对")
+
+            if candidates:
+                score_candidates(
+                    candidates,
+                    project_root_abs,
+                    main_db_path,
+                    ai_provider=args.ai_provider,
+                    ai_api_url=args.ai_api_url,
+                    ai_api_key=args.ai_api_key,
+                    ai_model_name=args.ai_model_name,
+                    max_content_length_for_ai_to_use=args.max_content_length_for_ai,
+                    force_rescore=(args.ai_scoring_mode == "force"),
+                    ai_scoring_batch_size=args.ai_scoring_batch_size,
+                    custom_scoring_prompt=args.custom_scoring_prompt,
+                    use_custom_scoring_prompt=args.use_custom_scoring_prompt,
+                    max_pairs_per_request=args.ai_scoring_batch_size,
+                    max_chars_per_note=args.max_chars_per_note,
+                    max_total_chars_per_request=args.max_total_chars_per_request,
+                    save_api_responses=args.save_api_responses,
+                    ai_concurrency=args.ai_concurrency,
+                    conn=conn,
+                )
+                logger.info("AI评分流程完成")
+            else:
+                logger.warning("没有足够的候选链接对，跳过AI评分流程")
+        elif not args.ai_api_key:
+            logger.warning("未提供 AI API Key, 跳过 AI 评分阶段。")
+
+        # 导出AI评分JSON（如果需要）
+        if not args.no_export_json or args.export_json:
+            export_ai_scores_to_json(
                 project_root_abs,
-                main_db_path,
-                ai_provider=args.ai_provider,
-                ai_api_url=args.ai_api_url,
-                ai_api_key=args.ai_api_key,
-                ai_model_name=args.ai_model_name,
-                max_content_length_for_ai=args.max_content_length_for_ai,
-                force_regen=(args.tags_mode == "force"),
-                batch_size=args.ai_scoring_batch_size,
-                custom_prompt=args.custom_scoring_prompt,
-                use_custom_prompt=args.use_custom_scoring_prompt,
-                max_chars_per_note=args.max_chars_per_note,
-                max_total_chars_per_request=args.max_total_chars_per_request,
-                save_api_responses=args.save_api_responses,
+                output_dir_abs,
+                min_score=args.min_ai_score,
+                export_format=args.export_format,
+                conn=conn,
+                pretty=args.pretty_json,
             )
-            logger.info("AI标签生成完成")
 
-            export_ai_tags_to_json(project_root_abs, output_dir_abs)
-            logger.info("标签数据已导出到JSON文件")
-    else:
-        logger.info("标签生成模式设置为跳过，已跳过标签生成阶段")
+        # 2.2 AI标签生成阶段（如果启用）
+        if args.tags_mode != "skip":
+            if not args.ai_api_key:
+                logger.warning("未提供 AI API Key, 跳过标签生成阶段。")
+            else:
+                logger.info("开始AI标签生成阶段（模式：%s）...", args.tags_mode)
+                generate_tags(
+                    project_root_abs,
+                    main_db_path,
+                    ai_provider=args.ai_provider,
+                    ai_api_url=args.ai_api_url,
+                    ai_api_key=args.ai_api_key,
+                    ai_model_name=args.ai_model_name,
+                    max_content_length_for_ai=args.max_content_length_for_ai,
+                    force_regen=(args.tags_mode == "force"),
+                    batch_size=args.ai_scoring_batch_size,
+                    custom_prompt=args.custom_scoring_prompt,
+                    use_custom_prompt=args.use_custom_scoring_prompt,
+                    max_chars_per_note=args.max_chars_per_note,
+                    max_total_chars_per_request=args.max_total_chars_per_request,
+                    save_api_responses=args.save_api_responses,
+                    conn=conn,
+                    ai_concurrency=args.ai_concurrency,
+                )
+                logger.info("AI标签生成完成")
+
+                export_ai_tags_to_json(project_root_abs, output_dir_abs, conn=conn, pretty=args.pretty_json)
+                logger.info("标签数据已导出到JSON文件")
+        else:
+            logger.info("标签生成模式设置为跳过，已跳过标签生成阶段")
     # ************ 修改结束 ************
 
     logger.info("流程完成，总耗时 %.2fs", time.time() - start_time)
@@ -5,18 +5,29 @@ from __future__ import annotations
 
 # ---------------------------- Embedding (Jina) -----------------------------
 JINA_API_URL: str = "https://api.jina.ai/v1/embeddings"
-# Delay (seconds) between successive Jina API requests to respect rate-limit
-JINA_API_REQUEST_DELAY: float = 0.1
+# Aggregate Jina request budget (requests per minute) shared by all in-flight
+# embedding packs; 0 means no fixed pacing. An HTTP 429 pauses every pack via the
+# shared token bucket (honouring Retry-After) before the request is retried.
+JINA_TARGET_QPM: int = 0
+# Number of Jina embedding requests kept in flight at the same time
+JINA_CONCURRENCY: int = 4
 
 # --------------------------- AI provider generic ---------------------------
-# Delay inserted between individual AI provider requests (seconds)
-AI_API_REQUEST_DELAY_SECONDS: float = 3.0
+# Aggregate request budget for AI provider calls (requests per minute), shared by
+# all concurrent scoring/tagging batches via a token bucket. The default matches
+# the old fixed 3 s delay so free-tier keys stay under provider limits; raise it
+# with --ai_target_qpm / --ai_request_burst when the account allows more.
+AI_TARGET_QPM: int = 20
+# Number of AI requests that may start back to back before AI_TARGET_QPM applies
+AI_REQUEST_BURST: int = 1
 
 # ------------------------------- Batch sizes -------------------------------
-EMBEDDING_BATCH_SIZE: int = 10  # number of notes per embedding batch
+EMBEDDING_BATCH_SIZE: int = 128  # number of notes per embedding batch (max inputs per Jina request)
+EMBEDDING_BATCH_MAX_CHARS: int = 90_000  # total characters per Jina request; larger batches are split
 AI_SCORING_BATCH_SIZE: int = 10  # 最大批量处理对数，可通过设置覆盖
 AI_SCORING_MAX_CHARS_PER_NOTE: int = 2000  # 每个笔记最大处理字符数，可通过设置覆盖
 AI_SCORING_MAX_TOTAL_CHARS: int = 23000  # 批量处理总字符数限制，可通过设置覆盖
+AI_SCORING_CONCURRENCY: int = 8  # 同时进行中的 AI 评分批量请求数，可通过设置覆盖
 
 # --------------------------- Default file names ---------------------------
 DEFAULT_EMBEDDINGS_FILE_NAME: str = "jina_embeddings.db"
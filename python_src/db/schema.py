@@ -50,7 +50,7 @@ CREATE TABLE IF NOT EXISTS notes (
     note_id      TEXT PRIMARY KEY,
     file_name    TEXT NOT NULL,
     content_hash TEXT NOT NULL,
-    embedding    BLOB -- JSON 数组
+    embedding    BLOB -- 二进制向量（见 embeddings/codec.py），旧数据为 JSON 数组
 );
 CREATE INDEX IF NOT EXISTS idx_notes_file_name ON notes(file_name);
 CREATE INDEX IF NOT EXISTS idx_notes_content_hash ON notes(content_hash);
@@ -66,6 +66,8 @@ CREATE TABLE IF NOT EXISTS scores (
     UNIQUE(note_id_a, note_id_b)
 );
 CREATE INDEX IF NOT EXISTS idx_scores_note_pair ON scores(note_id_a, note_id_b);
+-- 导出按源笔记分组、分数降序读取，按此索引顺序扫描即可，无需排序
+CREATE INDEX IF NOT EXISTS idx_scores_src_score ON scores(file_name_a, ai_score DESC);
 
 -- 可选: 保存批量 AI 请求 / 响应，便于调试
 CREATE TABLE IF NOT EXISTS ai_responses (
@@ -90,5 +92,23 @@ CREATE TABLE IF NOT EXISTS note_tags (
 );
 CREATE INDEX IF NOT EXISTS idx_note_tags_note ON note_tags(note_id);
 
+-- Embedding Cache 表: 按 (模型, 文本 SHA-256) 缓存嵌入，改名/移动或内容回退的笔记无需重新请求
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    model     TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    dim       INTEGER NOT NULL,
+    embedding BLOB NOT NULL, -- 编码格式同 notes.embedding
+    PRIMARY KEY (model, text_hash)
+);
+
+-- Tag Response Cache 表: 按 (模型, 提示词+正文哈希) 缓存单篇笔记的标签响应行；智能模式下内容未变但没有标签的笔记（重命名、标签被删等）无需再次请求
+CREATE TABLE IF NOT EXISTS tag_response_cache (
+    model       TEXT NOT NULL,
+    prompt_hash TEXT NOT NULL,
+    response    TEXT NOT NULL, -- 模型返回的该笔记那一行："标题: 标签1,标签2"
+    created_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (model, prompt_hash)
+);
+
 INSERT OR IGNORE INTO metadata (key, value) VALUES ('schema_version', '3.0');
 """
\ No newline at end of file
@@ -0,0 +1,39 @@
+# 常用 SQL 语句集中定义。sqlite3 按 SQL 文本缓存已编译语句，
+# 各处复用同一字符串即可命中缓存，也避免同一语句在多个模块中各写一份。
+
+INSERT_AI_RESPONSE = """
+INSERT INTO ai_responses (
+    batch_id, ai_provider, model_name, request_content, response_content, prompt_type
+) VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+UPSERT_SCORE = """
+INSERT INTO scores (note_id_a, file_name_a, note_id_b, file_name_b, ai_score)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(note_id_a, note_id_b) DO UPDATE SET
+    ai_score = excluded.ai_score
+"""
+
+INSERT_NOTE_TAG = """
+INSERT OR IGNORE INTO note_tags (note_id, tag, confidence)
+VALUES (?, ?, ?)
+"""
+
+UPSERT_NOTE = """
+INSERT INTO notes (note_id, file_name, content_hash, embedding)
+VALUES (?, ?, ?, ?)
+ON CONFLICT(note_id) DO UPDATE SET
+    file_name    = excluded.file_name,
+    content_hash = excluded.content_hash,
+    embedding    = excluded.embedding
+"""
+
+UPSERT_METADATA = "INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)"
+
+INSERT_EMBEDDING_CACHE = (
+    "INSERT OR REPLACE INTO embedding_cache (model, text_hash, dim, embedding) VALUES (?, ?, ?, ?)"
+)
+
+INSERT_TAG_RESPONSE_CACHE = (
+    "INSERT OR REPLACE INTO tag_response_cache (model, prompt_hash, response) VALUES (?, ?, ?)"
+)
@@ -0,0 +1,66 @@
+"""Embedding BLOB 编解码。
+
+notes.embedding 过去保存 JSON 数组文本，体积大且每次加载都要重新解析。
+现在以带 1 字节格式标记的二进制向量保存；旧的 JSON 文本仍可读取。"""
+from __future__ import annotations
+
+import json
+from typing import Sequence
+
+import numpy as np
+
+# 格式标记（BLOB 首字节）。JSON 文本以 "[" 开头，不会与之冲突。
+_FORMAT_FLOAT16 = 0x01
+_FORMAT_INT8 = 0x02  # 之后是 float32 缩放系数 + int8 分量，value = q * scale
+_FORMAT_FLOAT32 = 0x03
+
+# 默认写入格式，记录在 metadata.embedding_dtype 中便于排查
+EMBEDDING_DTYPE = "float16"
+
+
+def encode_embedding(
+    embedding: Sequence[float] | np.ndarray | None, dtype: str = EMBEDDING_DTYPE
+) -> bytes | None:
+    """把嵌入向量编码为 BLOB。空向量返回 None。
+
+    dtype="float16"：小端 float16；dtype="float32"：小端 float32，无损但体积翻倍；
+    dtype="int8"：按向量最大绝对值对称量化，体积约为 float16 的一半，余弦相似度误差约 1e-3。"""
+    if embedding is None or len(embedding) == 0:
+        return None
+    if dtype == "float16":
+        vec = np.asarray(embedding, dtype="<f2")
+        return bytes((_FORMAT_FLOAT16,)) + vec.tobytes()
+    if dtype == "float32":
+        vec = np.asarray(embedding, dtype="<f4")
+        return bytes((_FORMAT_FLOAT32,)) + vec.tobytes()
+    if dtype == "int8":
+        vec = np.asarray(embedding, dtype=np.float32)
+        max_abs = float(np.max(np.abs(vec)))
+        scale = max_abs / 127.0 if max_abs > 0 else 1.0
+        q = np.clip(np.rint(vec / scale), -127, 127).astype(np.int8)
+        return bytes((_FORMAT_INT8,)) + np.float32(scale).astype("<f4").tobytes() + q.tobytes()
+    raise ValueError(f"不支持的嵌入编码类型: {dtype}")
+
+
+def is_legacy_embedding(blob: bytes | str | None) -> bool:
+    """是否为旧版 JSON 文本格式（需要重新编码为二进制）。"""
+    return bool(blob) and (isinstance(blob, str) or blob[:1] == b"[")
+
+
+def decode_embedding(blob: bytes | str | None) -> np.ndarray | None:
+    """把 BLOB 解码为 float32 向量；兼容旧版 JSON 文本。空值返回 None。"""
+    if not blob:
+        return None
+    if is_legacy_embedding(blob):
+        return np.asarray(json.loads(blob), dtype=np.float32)
+    if blob[0] == _FORMAT_FLOAT16:
+        return np.frombuffer(blob, dtype="<f2", offset=1).astype(np.float32)
+    if blob[0] == _FORMAT_FLOAT32:
+        return np.frombuffer(blob, dtype="<f4", offset=1).astype(np.float32)
+    if blob[0] == _FORMAT_INT8:
+        scale = np.frombuffer(blob, dtype="<f4", count=1, offset=1)[0]
+        return np.frombuffer(blob, dtype=np.int8, offset=5).astype(np.float32) * scale
+    raise ValueError(f"未知的嵌入编码格式: 0x{blob[0]:02x}")
+
+
+__all__ = ["EMBEDDING_DTYPE", "encode_embedding", "decode_embedding", "is_legacy_embedding"]
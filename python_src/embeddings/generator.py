@@ -3,16 +3,65 @@
 真正实现 `get_jina_embedding` 与 `get_jina_embeddings_batch`，后续将脱离 legacy_full。"""
 from __future__ import annotations
 
+import hashlib
+import sqlite3
 import time
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import requests
 
+from python_src.embeddings.codec import decode_embedding, encode_embedding
+from python_src.utils.db import insert_embedding_cache_batch
 from python_src.utils.logger import get_logger
-from python_src.config import JINA_API_URL, JINA_API_REQUEST_DELAY
+from python_src.utils.rate_limiter import jina_api_limiter, retry_after_seconds
+from python_src.config import (
+    EMBEDDING_BATCH_MAX_CHARS,
+    EMBEDDING_BATCH_SIZE,
+    JINA_API_URL,
+    JINA_CONCURRENCY,
+)
 
 logger = get_logger(__name__)
 
+# 单条 SQL 中 IN (...) 的参数个数上限，低于 SQLite 默认的 999
+_CACHE_QUERY_CHUNK = 500
+
+
+def _is_non_retryable(status_code: int) -> bool:
+    """4xx 客户端错误不重试；429 限流按指数退避重试。"""
+    return 400 <= status_code < 500 and status_code != 429
+
+
+def _backoff(exc: requests.exceptions.RequestException, delay: float) -> None:
+    """重试前等待：429 时暂停共享的 Jina 限流器（优先使用 Retry-After），让所有并发分组一起退避。"""
+    response = getattr(exc, "response", None)
+    if response is not None and response.status_code == 429:
+        jina_api_limiter.pause(retry_after_seconds(response.headers, delay))
+    else:
+        time.sleep(delay)
+
+
+def pack_batches(
+    texts: List[str],
+    max_chars: int = EMBEDDING_BATCH_MAX_CHARS,
+    max_items: int = EMBEDDING_BATCH_SIZE,
+) -> Iterator[Tuple[int, int]]:
+    """按条数与累计字符数贪心分组，依次产出每组的 (start, end) 下标区间。
+
+    单条文本超过 max_chars 时独占一组。"""
+    start = 0
+    chars = 0
+    for idx, text in enumerate(texts):
+        size = len(text)
+        if idx > start and (idx - start >= max_items or chars + size > max_chars):
+            yield start, idx
+            start, chars = idx, 0
+        chars += size
+    if start < len(texts):
+        yield start, len(texts)
+
+
 def get_jina_embedding(
     text: str,
     jina_api_key_to_use: str,
@@ -43,7 +92,7 @@ def get_jina_embedding(
     delay = initial_delay
     for attempt in range(max_retries):
         try:
-            time.sleep(JINA_API_REQUEST_DELAY)
+            jina_api_limiter.acquire()
             response = requests.post(
                 JINA_API_URL,
                 headers=headers,
@@ -71,9 +120,9 @@ def get_jina_embedding(
                     exc.response.status_code,  # type: ignore[attr-defined]
                     exc.response.text,  # type: ignore[attr-defined]
                 )
-                if 400 <= exc.response.status_code < 500:  # type: ignore[attr-defined]
-                    return None  # 客户端错误无需重试
-            time.sleep(delay)
+                if _is_non_retryable(exc.response.status_code):  # type: ignore[attr-defined]
+                    return None  # 客户端错误无需重试（429 限流除外）
+            _backoff(exc, delay)
             delay *= 2  # 指数退避
         except Exception as exc:  # pylint: disable=broad-except
             logger.exception("处理 Jina API 响应时发生未知错误: %s", exc)
@@ -120,7 +169,7 @@ def get_jina_embeddings_batch(
     delay = initial_delay
     for attempt in range(max_retries):
         try:
-            time.sleep(JINA_API_REQUEST_DELAY)
+            jina_api_limiter.acquire()
             response = requests.post(
                 JINA_API_URL,
                 headers=headers,
@@ -148,9 +197,9 @@ def get_jina_embeddings_batch(
                     exc.response.status_code,  # type: ignore[attr-defined]
                     exc.response.text,  # type: ignore[attr-defined]
                 )
-                if 400 <= exc.response.status_code < 500:  # type: ignore[attr-defined]
+                if _is_non_retryable(exc.response.status_code):  # type: ignore[attr-defined]
                     return [None] * len(texts)
-            time.sleep(delay)
+            _backoff(exc, delay)
             delay *= 2
         except Exception as exc:  # pylint: disable=broad-except
             logger.exception("处理批量 Jina API 响应时发生未知错误: %s", exc)
@@ -160,4 +209,112 @@ def get_jina_embeddings_batch(
     return [None] * len(texts)
 
 
-__all__ = ["get_jina_embedding", "get_jina_embeddings_batch"]
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _load_cached_embeddings(
+    conn: sqlite3.Connection, model: str, hashes: List[str]
+) -> Dict[str, List[float]]:
+    """从 embedding_cache 表批量读取已缓存的嵌入，返回 text_hash -> 向量。"""
+    cached: Dict[str, List[float]] = {}
+    unique_hashes = list(dict.fromkeys(hashes))
+    for i in range(0, len(unique_hashes), _CACHE_QUERY_CHUNK):
+        chunk = unique_hashes[i : i + _CACHE_QUERY_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        rows = conn.execute(
+            f"SELECT text_hash, embedding FROM embedding_cache WHERE model = ? AND text_hash IN ({placeholders})",
+            (model, *chunk),
+        ).fetchall()
+        for text_hash, blob in rows:
+            vec = decode_embedding(blob)
+            if vec is not None:
+                cached[text_hash] = vec.tolist()
+    return cached
+
+
+def _store_cached_embeddings(
+    conn: sqlite3.Connection, model: str, items: List[Tuple[str, List[float]]]
+) -> None:
+    """把新生成的嵌入写入 embedding_cache 表。
+
+    经 _write_batch 写入：调用方已有未结束的事务（如嵌入流程中删除失效笔记）时不会被提前提交或回滚。"""
+    insert_embedding_cache_batch(
+        conn, [(model, text_hash, len(emb), encode_embedding(emb)) for text_hash, emb in items if emb]
+    )
+
+
+def get_jina_embeddings_packed(
+    texts: List[str],
+    jina_api_key_to_use: str,
+    jina_model_name_to_use: str,
+    max_items: int = EMBEDDING_BATCH_SIZE,
+    max_chars: int = EMBEDDING_BATCH_MAX_CHARS,
+    concurrency: int = JINA_CONCURRENCY,
+    cache_conn: Optional[sqlite3.Connection] = None,
+) -> List[Optional[List[float]]]:
+    """按 `pack_batches` 分组后并发调用 `get_jina_embeddings_batch`，结果与 texts 一一对应。
+
+    请求耗时主要在网络往返上，最多同时保持 concurrency 个请求。
+    提供 cache_conn 时先按 (模型, 文本 SHA-256) 查 embedding_cache 表，只请求未命中的文本，
+    相同文本只请求一次，新结果写回缓存。"""
+    if cache_conn is None:
+        return _embed_packs(
+            texts, jina_api_key_to_use, jina_model_name_to_use, max_items, max_chars, concurrency
+        )
+
+    hashes = [_text_hash(text) for text in texts]
+    cached = _load_cached_embeddings(cache_conn, jina_model_name_to_use, hashes)
+
+    misses: Dict[str, str] = {}
+    for text_hash, text in zip(hashes, texts):
+        if text_hash not in cached:
+            misses.setdefault(text_hash, text)
+    miss_hashes = list(misses)
+    miss_texts = list(misses.values())
+    logger.info("嵌入缓存命中 %s/%s 条，需请求 %s 条。", len(texts) - len(miss_texts), len(texts), len(miss_texts))
+
+    if miss_texts:
+        fresh = _embed_packs(
+            miss_texts, jina_api_key_to_use, jina_model_name_to_use, max_items, max_chars, concurrency
+        )
+        _store_cached_embeddings(cache_conn, jina_model_name_to_use, list(zip(miss_hashes, fresh)))
+        cached.update((h, emb) for h, emb in zip(miss_hashes, fresh) if emb)
+
+    return [cached.get(text_hash) for text_hash in hashes]
+
+
+def _embed_packs(
+    texts: List[str],
+    jina_api_key_to_use: str,
+    jina_model_name_to_use: str,
+    max_items: int,
+    max_chars: int,
+    concurrency: int,
+) -> List[Optional[List[float]]]:
+    packs = list(pack_batches(texts, max_chars=max_chars, max_items=max_items))
+
+    def embed_pack(bounds: Tuple[int, int]) -> List[Optional[List[float]]]:
+        start, end = bounds
+        return get_jina_embeddings_batch(
+            texts[start:end],
+            jina_api_key_to_use=jina_api_key_to_use,
+            jina_model_name_to_use=jina_model_name_to_use,
+        )
+
+    workers = max(1, min(concurrency or 1, len(packs)))
+    if workers == 1:
+        pack_results = [embed_pack(bounds) for bounds in packs]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pack_results = list(executor.map(embed_pack, packs))
+
+    return [emb for result in pack_results for emb in result]
+
+
+__all__ = [
+    "get_jina_embedding",
+    "get_jina_embeddings_batch",
+    "get_jina_embeddings_packed",
+    "pack_batches",
+]
@@ -2,36 +2,148 @@
 from __future__ import annotations
 
 import math
+from functools import lru_cache
 from typing import Dict, List
+
 import numpy as np
 
 from python_src.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# 笔记数达到该值且设置了每篇笔记的候选上限时，才启用 FAISS 近似检索
+_ANN_MIN_NOTES = 5000
+
+# 精确计算时单个相似度分块（行数 × N × float32）的内存上限，避免一次性构建 N×N 矩阵
+_SIM_TILE_BYTES = 64 * 1024 * 1024
+
+
+@lru_cache(maxsize=None)
+def _load_faiss():
+    """按需导入可选依赖 FAISS（pip install faiss-cpu），未安装时返回 None。
+
+    只在真正走近似检索时调用，小库或未设候选上限的运行不承担其导入耗时与加载日志。"""
+    try:
+        import faiss  # type: ignore
+    except ImportError:  # pragma: no cover - 未安装时回退到 NumPy 精确计算
+        return None
+    return faiss
+
 
 # --------------------------- 基础相似度计算 ---------------------------
 
 def cosine_similarity(vec1: List[float] | None, vec2: List[float] | None) -> float:
-    """计算两个向量的余弦相似度。向量维度不一致或为空时返回 0.0。"""
-    if not vec1 or not vec2 or len(vec1) != len(vec2):
+    """计算两个向量的余弦相似度。向量维度不一致或为空时返回 0.0。
+
+    批量计算请用 `generate_candidate_pairs`（先整体归一化再做矩阵乘法）。"""
+    if vec1 is None or vec2 is None or len(vec1) == 0 or len(vec1) != len(vec2):
         return 0.0
-    dot = sum(a * b for a, b in zip(vec1, vec2))
-    mag1 = math.sqrt(sum(a * a for a in vec1))
-    mag2 = math.sqrt(sum(b * b for b in vec2))
-    if mag1 == 0 or mag2 == 0:
+    a = np.asarray(vec1, dtype=np.float64)
+    b = np.asarray(vec2, dtype=np.float64)
+    # vdot 直接走 BLAS dot，避免 np.linalg.norm 的范数类型分派
+    denom = float(np.vdot(a, a)) * float(np.vdot(b, b))
+    if denom == 0.0:
         return 0.0
-    return dot / (mag1 * mag2)
+    return float(np.vdot(a, b)) / math.sqrt(denom)
 
 
 # ----------------------- 根据相似度生成候选对 -----------------------
 
-def generate_candidate_pairs(embeddings_data_input: Dict, similarity_threshold: float) -> List[Dict]:
-    """使用 NumPy 批量计算余弦相似度，生成候选链接对。"""
+def _tile_rows(n: int) -> int:
+    """按内存上限计算每个分块的行数；笔记较少时整个矩阵就是一个分块。"""
+    return max(1, _SIM_TILE_BYTES // (n * 4))
+
+
+def _concat_pairs(parts: List[tuple]):
+    """拼接各分块得到的 (rows, cols, sims)。"""
+    if not parts:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float32)
+    rows, cols, sims = zip(*parts)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(sims)
+
+
+def _threshold_pairs(vectors: np.ndarray, similarity_threshold: float):
+    """返回上三角 (i < j) 中相似度不低于阈值的 (rows, cols, sims)，按 (i, j) 排序。
+
+    按行分块计算，每块只与自身及之后的向量相乘。"""
+    n = vectors.shape[0]
+    step = _tile_rows(n)
+    parts = []
+    for start in range(0, n, step):
+        tile = vectors[start : start + step] @ vectors[start:].T  # (b, n - start)
+        # np.nonzero 只分配命中项大小的索引数组
+        rows, cols = np.nonzero(tile >= similarity_threshold)
+        upper = rows < cols
+        rows, cols = rows[upper], cols[upper]
+        if rows.size:
+            parts.append((rows + start, cols + start, tile[rows, cols]))
+    return _concat_pairs(parts)
+
+
+def _unique_pairs(rows: np.ndarray, cols: np.ndarray, sims: np.ndarray, n: int):
+    """把 (i, j) / (j, i) 邻接关系规范为 i < j 并去重，结果按 (i, j) 排序。"""
+    lo = np.minimum(rows, cols).astype(np.int64)
+    hi = np.maximum(rows, cols).astype(np.int64)
+    codes, first = np.unique(lo * n + hi, return_index=True)
+    return codes // n, codes % n, sims[first]
+
+
+def _topk_pairs(vectors: np.ndarray, similarity_threshold: float, k: int):
+    """每篇笔记只保留最相似的 k 个邻居（且不低于阈值），返回去重后的 (rows, cols, sims)。"""
+    n = vectors.shape[0]
+    step = _tile_rows(n)
+    parts = []
+    for start in range(0, n, step):
+        tile = vectors[start : start + step] @ vectors.T  # (b, n)
+        local = np.arange(tile.shape[0])
+        tile[local, local + start] = -np.inf  # 排除自身
+        nbrs = np.argpartition(-tile, k - 1, axis=1)[:, :k]
+        rows = np.repeat(local, k)
+        cols = nbrs.ravel()
+        sims = tile[rows, cols]
+        keep = sims >= similarity_threshold
+        parts.append((rows[keep] + start, cols[keep], sims[keep]))
+    rows, cols, sims = _concat_pairs(parts)
+    return _unique_pairs(rows, cols, sims, n)
+
+
+def _ann_pairs(vectors: np.ndarray, similarity_threshold: float, k: int):
+    """使用 FAISS HNSW 近似最近邻检索每篇笔记的 k 个邻居，返回去重后的 (rows, cols, sims)。
+
+    vectors 须已按行 L2 归一化，内积即余弦相似度。调用方须确认 `_load_faiss()` 不为 None。"""
+    faiss = _load_faiss()
+    n, dim = vectors.shape
+    index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+    index.hnsw.efConstruction = 200
+    index.hnsw.efSearch = max(64, 2 * (k + 1))
+    index.add(vectors)
+    sims, nbrs = index.search(vectors, k + 1)  # 多取一个以便剔除自身
+
+    rows = np.repeat(np.arange(n), k + 1)
+    cols = nbrs.ravel()
+    sims = sims.ravel()
+    keep = (cols >= 0) & (cols != rows) & (sims >= similarity_threshold)
+    return _unique_pairs(rows[keep], cols[keep], sims[keep], n)
+
+
+def generate_candidate_pairs(
+    embeddings_data_input: Dict,
+    similarity_threshold: float,
+    max_candidates_per_source: int | None = None,
+) -> List[Dict]:
+    """使用 NumPy 批量计算余弦相似度，生成候选链接对。
+
+    max_candidates_per_source 为正数时，每篇笔记只保留最相似的 k 个邻居，
+    候选对为这些邻接关系去重后的并集。此时若安装了 FAISS 且笔记数较多，
+    改用 HNSW 近似最近邻检索。精确计算按行分块进行，不会构建完整的 N×N 相似度矩阵。"""
     logger.info("[相似度] 开始生成候选链接对 …")
 
     files_data = embeddings_data_input.get("files", {})
-    items = [(p, info) for p, info in files_data.items() if info.get("embedding")]
+    items = [
+        (p, info) for p, info in files_data.items()
+        if info.get("embedding") is not None and len(info["embedding"]) > 0
+    ]
     if len(items) < 2:
         return []
 
@@ -43,27 +155,39 @@ def generate_candidate_pairs(embeddings_data_input: Dict, similarity_threshold:
     norms[norms == 0] = 1.0
     vectors /= norms
 
-    sim_matrix = vectors @ vectors.T  # (n, n)
     n = len(paths)
-    candidates: List[Dict] = []
-
-    for i in range(n):
-        for j in range(i + 1, n):
-            sim = float(sim_matrix[i, j])
-            if sim >= similarity_threshold:
-                candidates.append(
-                    {
-                        "source_path": paths[i],
-                        "target_path": paths[j],
-                        "jina_similarity": sim,
-                        "source_hash": files_data[paths[i]].get("hash"),
-                        "target_hash": files_data[paths[j]].get("hash"),
-                        "source_note_id": files_data[paths[i]].get("note_id"),
-                        "target_note_id": files_data[paths[j]].get("note_id"),
-                    }
-                )
-
-    candidates.sort(key=lambda x: x["jina_similarity"], reverse=True)
+    k = max_candidates_per_source if max_candidates_per_source and max_candidates_per_source > 0 else None
+    if k is not None and k >= n - 1:
+        k = None  # 上限不小于邻居总数时等价于不设上限
+
+    if k is not None and n >= _ANN_MIN_NOTES and _load_faiss() is not None:
+        logger.info("[相似度] 使用 FAISS HNSW 检索每篇笔记的前 %s 个邻居", k)
+        rows, cols, sims = _ann_pairs(vectors, similarity_threshold, k)
+    elif k is not None:
+        rows, cols, sims = _topk_pairs(vectors, similarity_threshold, k)
+    else:
+        rows, cols, sims = _threshold_pairs(vectors, similarity_threshold)
+
+    # 按相似度降序；稳定排序保证同分时仍按 (i, j) 顺序
+    order = np.argsort(-sims, kind="stable")
+
+    # 每篇笔记的 hash / note_id 只查一次，构建候选对时按下标取用
+    hashes = [info.get("hash") for _, info in items]
+    note_ids = [info.get("note_id") for _, info in items]
+
+    candidates: List[Dict] = [
+        {
+            "source_path": paths[i],
+            "target_path": paths[j],
+            "jina_similarity": sim,
+            "source_hash": hashes[i],
+            "target_hash": hashes[j],
+            "source_note_id": note_ids[i],
+            "target_note_id": note_ids[j],
+        }
+        for i, j, sim in zip(rows[order].tolist(), cols[order].tolist(), sims[order].tolist())
+    ]
+
     logger.info("[相似度] 生成完成，共 %s 条候选对。", len(candidates))
     return candidates
 
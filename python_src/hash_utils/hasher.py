@@ -1,6 +1,8 @@
 """Functions for extracting note content and computing SHA256 hashes."""
 from __future__ import annotations
 
+import hashlib
+
 HASH_BOUNDARY_MARKER = "<!-- HASH_BOUNDARY -->"
 
 
@@ -23,8 +25,4 @@ def extract_content_for_hashing(text_body: str) -> str | None:
 
 def calculate_hash_from_content(content: str) -> str:
     """SHA256 of given content (already normalised)."""
-    import hashlib
-
-    hasher = hashlib.sha256()
-    hasher.update(content.encode("utf-8"))
-    return hasher.hexdigest()
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
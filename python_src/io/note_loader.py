@@ -9,8 +9,9 @@ from __future__ import annotations
 import fnmatch
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import yaml
 
@@ -18,11 +19,42 @@ from python_src.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# 优先使用 LibYAML 的 C 实现解析 front-matter，未编译 LibYAML 时回退到纯 Python 版本
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
-def read_markdown_with_frontmatter(file_path: str) -> Tuple[str, Dict, str]:
+# 并行扫描一级子目录的线程数
+_SCAN_WORKERS = 8
+
+# 限长读取时为 front-matter 预留的字符数；front-matter 更长时按此步长继续读取
+_FRONTMATTER_READ_CHARS = 8192
+
+# front-matter 的结束行（完整的一行 "---"，允许前后空白）
+_FRONTMATTER_END_RE = re.compile(r"\n[^\S\n]*---[^\S\n]*\n")
+
+
+def _read_capped(fh, body_chars: int) -> str:
+    """读取完整的 front-matter 以及其后至少 body_chars 个字符（文件更短时读到末尾）。"""
+    content = fh.read(body_chars + _FRONTMATTER_READ_CHARS)
+    if not content.startswith("---"):
+        return content
+    match = _FRONTMATTER_END_RE.search(content)
+    while match is None:
+        more = fh.read(_FRONTMATTER_READ_CHARS)
+        if not more:
+            return content
+        content += more
+        match = _FRONTMATTER_END_RE.search(content)
+    missing = match.end() + body_chars - len(content)
+    if missing > 0:
+        content += fh.read(missing)
+    return content
+
+
+def read_markdown_with_frontmatter(file_path: str, max_body_chars: Optional[int] = None) -> Tuple[str, Dict, str]:
     """读取 Markdown 文件并分离 front-matter 与正文。
     
     同时处理 HASH_BOUNDARY_MARKER，只返回边界标记之前的正文内容。
+    给定 max_body_chars 时只读取 front-matter 与正文所需的前缀，正文截断到该长度。
 
     返回 (body_content, frontmatter_dict, raw_frontmatter_str)。
     若文件不含 front-matter，则字典与字符串均为空。"""
@@ -32,30 +64,42 @@ def read_markdown_with_frontmatter(file_path: str) -> Tuple[str, Dict, str]:
     if not path.exists():
         raise FileNotFoundError(file_path)
 
-    full_content = path.read_text(encoding="utf-8")
+    if max_body_chars is None:
+        full_content = path.read_text(encoding="utf-8")
+    else:
+        # 多读边界标记的长度，保证截断处附近的标记仍能被识别
+        with path.open(encoding="utf-8") as fh:
+            full_content = _read_capped(fh, max_body_chars + len(HASH_BOUNDARY_MARKER))
     frontmatter_str = ""
     frontmatter_dict: Dict = {}
     body_content = full_content
 
-    # Front-matter 检测
+    # Front-matter 检测：逐行向后查找结束的 "---"，只扫描到 front-matter 结束处，不切分整篇正文
     if full_content.startswith("---"):
-        lines = full_content.split("\n")
-        frontmatter_end = next((i for i, line in enumerate(lines[1:], start=1) if line.strip() == "---"), -1)
-        if frontmatter_end != -1:
-            frontmatter_lines = lines[1:frontmatter_end]
-            frontmatter_block = "\n".join(frontmatter_lines)
-            body_content = "\n".join(lines[frontmatter_end + 1 :])
-            frontmatter_str = frontmatter_block
-            try:
-                frontmatter_dict = yaml.safe_load(frontmatter_block) or {}
-            except yaml.YAMLError as exc:
-                logger.warning("解析 front-matter 失败 (%s): %s", file_path, exc)
-                frontmatter_dict = {}
+        block_start = full_content.find("\n") + 1
+        line_start = block_start
+        while block_start:
+            line_end = full_content.find("\n", line_start)
+            line = full_content[line_start:] if line_end == -1 else full_content[line_start:line_end]
+            if line.strip() == "---":
+                frontmatter_str = full_content[block_start : max(block_start, line_start - 1)]
+                body_content = "" if line_end == -1 else full_content[line_end + 1 :]
+                try:
+                    frontmatter_dict = yaml.load(frontmatter_str, Loader=_YAML_LOADER) or {}
+                except yaml.YAMLError as exc:
+                    logger.warning("解析 front-matter 失败 (%s): %s", file_path, exc)
+                    frontmatter_dict = {}
+                break
+            if line_end == -1:
+                break
+            line_start = line_end + 1
     
     # 处理哈希边界标记，只保留边界标记之前的内容
     boundary_idx = body_content.find(HASH_BOUNDARY_MARKER)
     if boundary_idx != -1:
         body_content = body_content[:boundary_idx].rstrip()
+    if max_body_chars is not None:
+        body_content = body_content[:max_body_chars]
     
     return body_content, frontmatter_dict, frontmatter_str
 
@@ -96,9 +140,9 @@ def list_markdown_files(
             return []
     
     # 处理排除文件夹：支持完整路径和单独文件夹名
-    simple_folders = []  # 单一文件夹名
-    path_folders = []    # 包含路径的文件夹
-    
+    simple_folders = set()  # 单一文件夹名
+    path_folders = []       # 包含路径的文件夹
+
     for ef in excluded_folders:
         ef = ef.lower().strip()
         if ef:
@@ -107,81 +151,103 @@ def list_markdown_files(
                 path_folders.append(ef)
             else:
                 # 是一个单独的文件夹名
-                simple_folders.append(ef)
-    
+                simple_folders.add(ef)
+    path_folder_prefixes = tuple(path_folders)
+
     if not os.path.isdir(scan_directory_abs):
         logger.error("扫描路径 %s 不是有效文件夹或文件。", scan_directory_abs)
         return []
 
-    # Compile glob patterns for file exclusion
-    file_patterns = []
-    path_patterns = []
-    for pat in excluded_files_patterns:
-        pat = pat.strip()
-        if not pat:
-            continue
-            
-        try:
-            if '/' in pat:
-                # 包含路径的模式，用于完整路径匹配
-                path_patterns.append(re.compile(fnmatch.translate(pat), re.IGNORECASE))
-            else:
-                # 仅文件名的模式
-                file_patterns.append(re.compile(fnmatch.translate(pat), re.IGNORECASE))
-        except re.error as exc:
-            logger.warning("无效的排除文件模式 '%s': %s", pat, exc)
+    # 排除模式按是否含路径分成两组，每组合并为一个正则
+    file_pattern = _compile_exclude_patterns(p for p in excluded_files_patterns if '/' not in p)
+    path_pattern = _compile_exclude_patterns(p for p in excluded_files_patterns if '/' in p)
 
-    markdown_files: List[str] = []
-
-    for root, dirs, files in os.walk(scan_directory_abs, topdown=True):
-        # 排除单一文件夹名
-        dirs[:] = [d for d in dirs if d.lower() not in simple_folders]
-        
-        # 排除特定路径下的文件夹
-        rel_dir = os.path.relpath(root, project_root_abs).replace(os.sep, "/")
-        if rel_dir == '.':
-            rel_dir = ''
-            
+    def scan_one(dir_abs: str, rel_dir: str) -> Tuple[List[str], List[Tuple[str, str]]]:
+        """读取单个目录，返回 (本目录下保留的 .md 相对路径, 待深入的子目录)。"""
         # 检查当前目录是否匹配任何路径排除模式
-        if any(rel_dir.lower().startswith(path_folder) or rel_dir.lower() == path_folder 
-               for path_folder in path_folders):
-            dirs[:] = []  # 清空子目录列表，不再深入
-            continue
+        if path_folder_prefixes and rel_dir.lower().startswith(path_folder_prefixes):
+            return [], []
+        try:
+            with os.scandir(dir_abs) as it:
+                entries = list(it)
+        except OSError as exc:
+            logger.warning("无法读取目录 %s: %s", dir_abs, exc)
+            return [], []
+
+        files: List[str] = []
+        subdirs: List[Tuple[str, str]] = []
+        for entry in entries:
+            name = entry.name
+            rel_path = f"{rel_dir}/{name}" if rel_dir else name
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                # 与 os.walk 一致：不进入目录符号链接
+                if name.lower() not in simple_folders and not entry.is_symlink():
+                    subdirs.append((entry.path, rel_path))
+                continue
 
-        for fname in files:
-            if not fname.endswith(".md"):
+            if not name.endswith(".md"):
                 continue
 
-            # 排除特定文件名模式
-            basename = os.path.splitext(fname)[0].lower()
-            if any(p.search(fname.lower()) or p.search(basename) for p in file_patterns):
+            # 排除特定文件名模式（带或不带扩展名）
+            lower_name = name.lower()
+            if file_pattern and (file_pattern.search(lower_name) or file_pattern.search(lower_name[:-3])):
                 continue
 
-            # 生成相对路径
-            file_abs_path = os.path.join(root, fname)
-            rel_path = os.path.relpath(file_abs_path, project_root_abs).replace(os.sep, "/")
-            
             # 检查完整路径是否匹配任何路径模式
-            if any(p.search(rel_path.lower()) for p in path_patterns):
-                continue
-                
-            # 确保不在排除的路径中
-            parts = rel_path.split("/")
-            should_exclude = False
-            for i in range(len(parts) - 1):
-                partial_path = "/".join(parts[:i+1]).lower()
-                if partial_path in path_folders:
-                    should_exclude = True
-                    break
-            
-            if should_exclude:
+            if path_pattern and path_pattern.search(rel_path.lower()):
                 continue
-                
-            markdown_files.append(rel_path)
+
+            files.append(rel_path)
+        return files, subdirs
+
+    def scan_tree(dir_abs: str, rel_dir: str) -> List[str]:
+        """深度优先扫描，顺序与 os.walk(topdown=True) 相同。"""
+        files, subdirs = scan_one(dir_abs, rel_dir)
+        for sub_abs, sub_rel in subdirs:
+            files.extend(scan_tree(sub_abs, sub_rel))
+        return files
+
+    root_rel = os.path.relpath(scan_directory_abs, project_root_abs).replace(os.sep, "/")
+    if root_rel == '.':
+        root_rel = ''
+
+    # 根目录在当前线程读取，各一级子目录分发到线程池并行扫描（readdir/stat 期间释放 GIL），
+    # executor.map 保证结果仍按目录顺序拼接。
+    markdown_files, top_dirs = scan_one(scan_directory_abs, root_rel)
+    if len(top_dirs) > 1:
+        with ThreadPoolExecutor(max_workers=min(_SCAN_WORKERS, len(top_dirs))) as executor:
+            for sub_files in executor.map(lambda d: scan_tree(*d), top_dirs):
+                markdown_files.extend(sub_files)
+    else:
+        for sub_abs, sub_rel in top_dirs:
+            markdown_files.extend(scan_tree(sub_abs, sub_rel))
 
     return markdown_files
 
 
+def _compile_exclude_patterns(patterns: Iterable[str]) -> Optional[re.Pattern]:
+    """把多个 glob 模式合并为一个忽略大小写的正则；无有效模式时返回 None。"""
+    parts = []
+    for pat in patterns:
+        pat = pat.strip()
+        if not pat:
+            continue
+        regex = fnmatch.translate(pat)
+        try:
+            re.compile(regex)
+        except re.error as exc:
+            logger.warning("无效的排除文件模式 '%s': %s", pat, exc)
+            continue
+        parts.append(f"(?:{regex})")
+    if not parts:
+        return None
+    return re.compile("|".join(parts), re.IGNORECASE)
+
+
 __all__ = [
     "read_markdown_with_frontmatter",
     "list_markdown_files",
@@ -1,42 +1,117 @@
 """Note output helpers (write & export)."""
 from __future__ import annotations
 
+import gzip
 import json
 import os
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict
-
-import yaml
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from python_src.utils.logger import get_logger
 from python_src.config import (
     DEFAULT_MAIN_DB_FILE_NAME,
 )
 from python_src.hash_utils.hasher import HASH_BOUNDARY_MARKER
+from python_src.utils.db import get_db_connection
 
 logger = get_logger(__name__)
 
+# 导出文件的写缓冲：json.dump 与逐行流式写出会产生大量小块写入，
+# 1 MiB 缓冲把它们合并成少量系统调用（默认仅 8 KiB）
+_EXPORT_BUFFER_SIZE = 1 << 20
+
+# 标记为纯 ASCII，可直接在原始字节中查找
+_HASH_BOUNDARY_MARKER_BYTES = HASH_BOUNDARY_MARKER.encode("utf-8")
+
+# 批量写回笔记时的线程数：写入以系统调用为主，不受 GIL 限制
+_WRITE_WORKERS = 8
+
+
+def _universal_newlines(text: str) -> str:
+    """与文本模式读取一致：把 \r\n / \r 统一为 \n。"""
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _open_readonly(db_path: str | Path) -> sqlite3.Connection:
+    """打开导出用的连接：沿用 `get_db_connection` 的缓存/mmap 设置，并禁止写入。"""
+    conn = get_db_connection(str(db_path))
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+def _write_json(obj, fh, pretty: bool = False) -> None:
+    """把 obj 写入已打开的文本文件。
+
+    默认输出紧凑格式：json.dumps 一次性编码走 C 编码器，体积约为缩进格式的一半；
+    pretty=True 时以 json.dump 缩进 2 格逐块写出，便于人工查看。"""
+    if pretty:
+        json.dump(obj, fh, ensure_ascii=False, indent=2)
+    else:
+        fh.write(json.dumps(obj, ensure_ascii=False, separators=(",", ":")))
+
+
+def _open_export_text(path: str | Path):
+    """以带大缓冲的文本模式打开导出文件；扩展名为 .gz 时透明地 gzip 压缩。
+
+    嵌入向量以浮点文本为主，压缩比通常在 3 倍以上；level 3 的压缩开销远小于默认的 9。"""
+    if str(path).endswith(".gz"):
+        return gzip.open(path, "wt", encoding="utf-8", compresslevel=3)
+    return open(path, "w", encoding="utf-8", buffering=_EXPORT_BUFFER_SIZE)
+
+
+@contextmanager
+def _export_conn(db_path: str | Path, conn: Optional[sqlite3.Connection] = None) -> Iterator[sqlite3.Connection]:
+    """传入 conn 时直接复用（不关闭），否则打开只读连接并在结束后关闭。"""
+    if conn is not None:
+        yield conn
+        return
+    own_conn = _open_readonly(db_path)
+    try:
+        yield own_conn
+    finally:
+        own_conn.close()
+
+
 # ---------------------------------------------------------------------------
 # 文件写入
 # ---------------------------------------------------------------------------
 
-def write_markdown_with_frontmatter(file_path: str, frontmatter: Dict, body: str) -> None:
-    """将 front-matter 与正文组合写入 Markdown 文件，保留哈希边界标记后的内容。"""
+def _render_frontmatter(frontmatter: Dict) -> str:
+    """渲染 ``---`` 包裹的 front-matter 块。
+
+    yaml 在首次写回笔记时才导入，只做 JSON 导出的调用（如 --export_json_only）无需承担其导入开销。"""
+    import yaml
+
+    # 优先使用 LibYAML 的 C 实现输出，未编译 LibYAML 时回退到纯 Python 版本
+    dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+    fm_dump = yaml.dump(frontmatter, Dumper=dumper, allow_unicode=True, default_flow_style=False, sort_keys=False)
+    return f"---\n{fm_dump.strip()}\n---\n"
+
+
+def write_markdown_with_frontmatter(file_path: str, frontmatter: Dict, body: str) -> bool:
+    """将 front-matter 与正文组合写入 Markdown 文件，保留哈希边界标记后的内容。
+
+    返回文件是否已包含给定内容（写入成功或内容未变化）；错误会被记录而不抛出。"""
     try:
         # 检查文件是否存在，如果存在则读取原内容，获取哈希边界后的内容
-        original_content = ""
         original_post_boundary_content = ""
+        original_bytes = None
         
         if os.path.exists(file_path):
             try:
-                original_content = Path(file_path).read_text(encoding="utf-8")
-                boundary_idx = original_content.find(HASH_BOUNDARY_MARKER)
+                # 在原始字节中查找标记，只解码标记之后的部分，无需解码整个文件
+                original_bytes = Path(file_path).read_bytes()
+                boundary_idx = original_bytes.find(_HASH_BOUNDARY_MARKER_BYTES)
                 
                 if boundary_idx != -1:
                     # 保存哈希边界后的内容
-                    boundary_end_idx = boundary_idx + len(HASH_BOUNDARY_MARKER)
-                    original_post_boundary_content = original_content[boundary_end_idx:]
+                    boundary_end_idx = boundary_idx + len(_HASH_BOUNDARY_MARKER_BYTES)
+                    original_post_boundary_content = _universal_newlines(
+                        original_bytes[boundary_end_idx:].decode("utf-8")
+                    )
                     logger.debug("已保存哈希边界标记后的内容用于保留")
             except Exception as e:
                 logger.warning(f"读取原文件时出错: {e}, 将不保留边界后内容")
@@ -44,8 +119,7 @@ def write_markdown_with_frontmatter(file_path: str, frontmatter: Dict, body: str
         # 构建新文件内容
         output = ""
         if frontmatter:
-            fm_dump = yaml.dump(frontmatter, allow_unicode=True, default_flow_style=False, sort_keys=False)
-            output = f"---\n{fm_dump.strip()}\n---\n"
+            output = _render_frontmatter(frontmatter)
 
         # 防止正文首行空白
         body_clean = body.lstrip("\n")
@@ -57,9 +131,15 @@ def write_markdown_with_frontmatter(file_path: str, frontmatter: Dict, body: str
             if original_post_boundary_content:
                 output = output.rstrip() + "\n\n" + HASH_BOUNDARY_MARKER + original_post_boundary_content
         
+        # 内容与磁盘上一致时跳过写入（按 write_text 的换行转换后逐字节比较），文件 mtime 保持不变
+        if original_bytes is not None and output.replace("\n", os.linesep).encode("utf-8") == original_bytes:
+            logger.debug(f"文件 {file_path} 内容未变化，跳过写入")
+            return True
+
         path = Path(file_path)
         path.write_text(output, encoding="utf-8")
         logger.debug(f"写入文件 {file_path} 完成，已保留哈希边界后内容")
+        return True
         
     except Exception as e:
         logger.error(f"写入文件 {file_path} 时出错: {e}")
@@ -67,62 +147,93 @@ def write_markdown_with_frontmatter(file_path: str, frontmatter: Dict, body: str
         try:
             basic_output = ""
             if frontmatter:
-                fm_dump = yaml.dump(frontmatter, allow_unicode=True, default_flow_style=False, sort_keys=False)
-                basic_output = f"---\n{fm_dump.strip()}\n---\n"
+                basic_output = _render_frontmatter(frontmatter)
             basic_output += body.lstrip("\n")
             Path(file_path).write_text(basic_output, encoding="utf-8")
+            return True
         except:
             logger.critical(f"写入文件 {file_path} 的基本内容也失败")
+            return False
+
+
+def write_markdown_batch(items: List[Tuple[str, Dict, str]], max_workers: int = _WRITE_WORKERS) -> List[str]:
+    """并发写回多篇笔记，items 为 (file_path, frontmatter, body) 列表，返回写入失败的 file_path 列表。
+
+    每篇仍由 `write_markdown_with_frontmatter` 处理（其内部记录并吞掉错误），
+    多个文件的读写在线程池中重叠进行。"""
+    if not items:
+        return []
+    if len(items) == 1 or max_workers <= 1:
+        written = [write_markdown_with_frontmatter(*item) for item in items]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+            written = list(executor.map(lambda item: write_markdown_with_frontmatter(*item), items))
+    return [item[0] for item, ok in zip(items, written) if not ok]
 
 
 # ---------------------------------------------------------------------------
 # 导出 JSON
 # ---------------------------------------------------------------------------
 
-def export_embeddings_to_json(db_path: str, json_output_path: str) -> bool:
-    """从嵌入 SQLite 数据库导出 JSON（兼容旧版插件）。"""
+def export_embeddings_to_json(
+    db_path: str,
+    json_output_path: str,
+    conn: Optional[sqlite3.Connection] = None,
+) -> bool:
+    """从嵌入 SQLite 数据库导出 JSON（兼容旧版插件）。
+
+    逐行流式写出，不在内存中汇总全部嵌入；旧版 JSON 文本格式的嵌入原样写出，无需解析。
+    json_output_path 以 ``.gz`` 结尾时边写边以 gzip（level 3）压缩。
+    传入 conn 时复用该连接且不关闭。"""
+    from python_src.embeddings.codec import decode_embedding, is_legacy_embedding  # 依赖 numpy，仅在此处需要
+
     logger.info("[导出] 导出嵌入库 %s -> %s", db_path, json_output_path)
 
     try:
-        conn = sqlite3.connect(db_path)
-        cur = conn.cursor()
-
-        metadata: Dict[str, str] = {
-            key: value for key, value in cur.execute("SELECT key, value FROM metadata")
-        }
-
-        files_data: Dict[str, Dict] = {}
-        for row in cur.execute(
-            """
-            SELECT file_path, content_hash, embedding, processed_content
-            FROM file_embeddings
-            """
-        ):
-            file_path, content_hash, embedding_json, processed_content = row
-            embedding = json.loads(embedding_json) if embedding_json else None
-            files_data[file_path] = {
-                "hash": content_hash,
-                "embedding": embedding,
-                "processed_content": processed_content,
-            }
+        with _export_conn(db_path, conn) as export_conn:
+            cur = export_conn.cursor()
 
-        output_data = {
-            "_metadata": {
+            metadata: Dict[str, str] = {
+                key: value for key, value in cur.execute("SELECT key, value FROM metadata")
+            }
+            export_metadata = {
                 "generated_at_utc": metadata.get("created_at"),
                 "jina_model_name": metadata.get("jina_model_name", "unknown"),
                 "script_version": "2.0_plugin_compatible_json_export",
                 "exported_from": os.path.basename(db_path),
                 "storage_strategy": "sqlite_dual_db",
-            },
-            "files": files_data,
-        }
-
-        os.makedirs(os.path.dirname(json_output_path), exist_ok=True)
-        Path(json_output_path).write_text(
-            json.dumps(output_data, ensure_ascii=False, indent=2), encoding="utf-8"
-        )
-        logger.info("[成功] 成功导出 %s 个文件嵌入", len(files_data))
-        conn.close()
+            }
+
+            os.makedirs(os.path.dirname(json_output_path), exist_ok=True)
+            file_count = 0
+            with _open_export_text(json_output_path) as fh:
+                fh.write('{\n  "_metadata": ')
+                fh.write(json.dumps(export_metadata, ensure_ascii=False))
+                fh.write(',\n  "files": {')
+                for file_path, content_hash, embedding_blob, processed_content in cur.execute(
+                    """
+                    SELECT file_path, content_hash, embedding, processed_content
+                    FROM file_embeddings
+                    """
+                ):
+                    if is_legacy_embedding(embedding_blob):
+                        embedding_json = embedding_blob if isinstance(embedding_blob, str) else embedding_blob.decode("utf-8")
+                    else:
+                        embedding = decode_embedding(embedding_blob)
+                        embedding_json = json.dumps(embedding.tolist() if embedding is not None else None)
+                    fh.write(",\n    " if file_count else "\n    ")
+                    fh.write(json.dumps(file_path, ensure_ascii=False))
+                    fh.write(': {"hash": ')
+                    fh.write(json.dumps(content_hash))
+                    fh.write(', "embedding": ')
+                    fh.write(embedding_json)
+                    fh.write(', "processed_content": ')
+                    fh.write(json.dumps(processed_content, ensure_ascii=False))
+                    fh.write("}")
+                    file_count += 1
+                fh.write("\n  }\n}\n")
+
+        logger.info("[成功] 成功导出 %s 个文件嵌入", file_count)
         return True
     except Exception as exc:  # pylint: disable=broad-except
         logger.error("[错误] 导出嵌入 JSON 失败: %s", exc)
@@ -134,33 +245,65 @@ def export_ai_scores_to_json(
     output_dir_abs: str,
     export_dir_name: str = ".jina-linker",
     min_score: int = 7,
+    export_format: str = "json",
+    conn: Optional[sqlite3.Connection] = None,
+    pretty: bool = False,
 ) -> None:
-    """导出 AI 评分数据为 JSON（新格式：ai_scores_by_source）。"""
+    """导出 AI 评分数据为 JSON（新格式：ai_scores_by_source）。
+
+    export_format="ndjson" 时改为逐行流式写出 ai_scores.ndjson（每行一个
+    ``{"source", "target", "score"}`` 对象），不在内存中汇总全部评分。
+    传入 conn 时复用该连接（流水线末尾的各项导出共用同一连接，页缓存保持热态）且不关闭。
+    ai_scores.json 默认为紧凑格式，pretty=True 时缩进输出。"""
     logger.info("[导出] 正在导出 AI 评分数据到 JSON...")
 
     json_dir = Path(project_root_abs) / export_dir_name
     json_dir.mkdir(parents=True, exist_ok=True)
 
     ai_scores_db = Path(output_dir_abs) / DEFAULT_MAIN_DB_FILE_NAME
-    ai_scores_json = json_dir / "ai_scores.json"
     if not ai_scores_db.exists():
         logger.warning("AI scores DB 不存在: %s", ai_scores_db)
         return
 
-    # 读取并分组
-    conn = sqlite3.connect(ai_scores_db)
-    cur = conn.cursor()
+    with _export_conn(ai_scores_db, conn) as export_conn:
+        _write_ai_scores(export_conn.cursor(), json_dir, ai_scores_db, min_score, export_format, pretty)
+
+
+def _write_ai_scores(
+    cur: sqlite3.Cursor, json_dir: Path, ai_scores_db: Path, min_score: int, export_format: str, pretty: bool
+) -> None:
+    """按 export_format 把 scores 写入 json_dir。"""
+    ai_scores_json = json_dir / "ai_scores.json"
+    if export_format == "ndjson":
+        ai_scores_ndjson = json_dir / "ai_scores.ndjson"
+        row_count = 0
+        with ai_scores_ndjson.open("w", encoding="utf-8", buffering=_EXPORT_BUFFER_SIZE) as fh:
+            for src, tgt, score in cur.execute(
+                """
+                SELECT file_name_a, file_name_b, ai_score FROM scores
+                WHERE ai_score >= ?
+                ORDER BY file_name_a, ai_score DESC, pair_id
+                """,
+                (min_score,),
+            ):
+                fh.write(json.dumps({"source": src, "target": tgt, "score": score}, ensure_ascii=False, separators=(",", ":")))
+                fh.write("\n")
+                row_count += 1
+        logger.info("[成功] 流式导出 %s 条 AI 评分 -> %s", row_count, ai_scores_ndjson.name)
+        return
+
+    # 读取并分组：排序交给 SQLite（走 idx_scores_src_score），同分按写入顺序
     source_map: Dict[str, list] = {}
     for src, tgt, score in cur.execute(
-        "SELECT file_name_a, file_name_b, ai_score FROM scores WHERE ai_score >= ?",
+        """
+        SELECT file_name_a, file_name_b, ai_score FROM scores
+        WHERE ai_score >= ?
+        ORDER BY file_name_a, ai_score DESC, pair_id
+        """,
         (min_score,),
     ):
         source_map.setdefault(src, []).append([tgt, score])
 
-    # 按分数排序（降序）
-    for lst in source_map.values():
-        lst.sort(key=lambda x: x[1], reverse=True)
-
     output = {
         "_metadata": {
             "description": "AI scores (grouped by source)",
@@ -169,8 +312,8 @@ def export_ai_scores_to_json(
         "ai_scores_by_source": source_map,
     }
 
-    ai_scores_json.write_text(json.dumps(output, ensure_ascii=False, indent=2), encoding="utf-8")
-    conn.close()
+    with ai_scores_json.open("w", encoding="utf-8", buffering=_EXPORT_BUFFER_SIZE) as fh:
+        _write_json(output, fh, pretty)
     logger.info("[成功] 导出 %s 源笔记的 AI 评分", len(source_map))
 
 
@@ -178,8 +321,10 @@ def export_ai_tags_to_json(
     project_root_abs: str,
     output_dir_abs: str,
     export_dir_name: str = ".jina-linker",
+    conn: Optional[sqlite3.Connection] = None,
+    pretty: bool = False,
 ) -> None:
-    """导出 note_tags 为 JSON。"""
+    """导出 note_tags 为 JSON（默认紧凑格式，pretty=True 时缩进输出）。传入 conn 时复用该连接且不关闭。"""
     logger.info("[导出] 正在导出 AI 标签到 JSON…")
 
     json_dir = Path(project_root_abs) / export_dir_name
@@ -191,17 +336,13 @@ def export_ai_tags_to_json(
         logger.warning("DB 不存在: %s", db_path)
         return
 
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-
     tags_map: Dict[str, list] = {}
-    for note_id, tag in cur.execute("SELECT note_id, tag FROM note_tags"):
-        cur2 = conn.execute("SELECT file_name FROM notes WHERE note_id = ?", (note_id,))
-        row = cur2.fetchone()
-        if not row:
-            continue
-        file_name = row[0]
-        tags_map.setdefault(file_name, []).append(tag)
+    with _export_conn(db_path, conn) as export_conn:
+        # 单条 JOIN 取代逐行查询 notes；没有对应笔记的标签自然被过滤
+        for file_name, tag in export_conn.execute(
+            "SELECT n.file_name, t.tag FROM note_tags t JOIN notes n ON n.note_id = t.note_id ORDER BY t.id"
+        ):
+            tags_map.setdefault(file_name, []).append(tag)
 
     output = {
         "_metadata": {
@@ -211,12 +352,13 @@ def export_ai_tags_to_json(
         "ai_tags_by_note": tags_map,
     }
 
-    tags_json.write_text(json.dumps(output, ensure_ascii=False, indent=2), encoding="utf-8")
-    conn.close()
+    with tags_json.open("w", encoding="utf-8", buffering=_EXPORT_BUFFER_SIZE) as fh:
+        _write_json(output, fh, pretty)
     logger.info("[成功] 导出 %s 篇笔记标签", len(tags_map))
 
 __all__ = [
     "write_markdown_with_frontmatter",
+    "write_markdown_batch",
     "export_embeddings_to_json",
     "export_ai_scores_to_json",
     "export_ai_tags_to_json",
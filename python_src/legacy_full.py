@@ -1,13 +1,54 @@
-"""Re-export symbols from original main.py so old imports keep working.
-This file will shrink as real implementations move to python_src packages."""
-from importlib import import_module
-import sys
-import pathlib
+"""Re-export the former main.py API from its new python_src homes so old imports keep working.
+This file will shrink as callers move to importing from python_src packages directly.
 
-ROOT = pathlib.Path(__file__).resolve().parents[1]
-if str(ROOT) not in sys.path:
-    sys.path.insert(0, str(ROOT))
+main.py 已拆分进 python_src 各子包，这里只显式转发仍可能被旧代码使用的名称；
+不再导入 main，也不再把其全部属性复制进本模块命名空间。"""
+from python_src.ai_scoring.provider import call_ai_api_batch_for_relevance, save_api_response
+from python_src.ai_scoring.scorer import (
+    build_ai_batch_request,
+    extract_score_from_text,
+    extract_scores_from_text,
+    parse_ai_batch_response,
+)
+from python_src.embeddings.generator import get_jina_embedding, get_jina_embeddings_batch
+from python_src.embeddings.similarity import cosine_similarity, generate_candidate_pairs
+from python_src.hash_utils.hasher import (
+    HASH_BOUNDARY_MARKER,
+    calculate_hash_from_content,
+    extract_content_for_hashing,
+)
+from python_src.io.note_loader import list_markdown_files, read_markdown_with_frontmatter
+from python_src.io.output_writer import (
+    export_ai_scores_to_json,
+    export_ai_tags_to_json,
+    export_embeddings_to_json,
+    write_markdown_with_frontmatter,
+)
+from python_src.orchestrator.embed_pipeline import process_and_embed_notes
+from python_src.orchestrator.link_scoring import score_candidates
+from python_src.orchestrator.tag_generation import generate_tags
 
-legacy_mod = import_module("main")
-
-globals().update({k: v for k, v in vars(legacy_mod).items() if not k.startswith("__")}) 
\ No newline at end of file
+__all__ = [
+    "HASH_BOUNDARY_MARKER",
+    "build_ai_batch_request",
+    "calculate_hash_from_content",
+    "call_ai_api_batch_for_relevance",
+    "cosine_similarity",
+    "export_ai_scores_to_json",
+    "export_ai_tags_to_json",
+    "export_embeddings_to_json",
+    "extract_content_for_hashing",
+    "extract_score_from_text",
+    "extract_scores_from_text",
+    "generate_candidate_pairs",
+    "generate_tags",
+    "get_jina_embedding",
+    "get_jina_embeddings_batch",
+    "list_markdown_files",
+    "parse_ai_batch_response",
+    "process_and_embed_notes",
+    "read_markdown_with_frontmatter",
+    "save_api_response",
+    "score_candidates",
+    "write_markdown_with_frontmatter",
+]
@@ -2,24 +2,60 @@
 from __future__ import annotations
 
 import datetime as _dt
-import json
 import os
-from typing import Dict, List
-
-from python_src.config import EMBEDDING_BATCH_SIZE
-from python_src.embeddings.generator import get_jina_embeddings_batch
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from python_src.config import EMBEDDING_BATCH_SIZE, JINA_CONCURRENCY
+from python_src.db.statements import UPSERT_METADATA, UPSERT_NOTE
+from python_src.embeddings.codec import (
+    EMBEDDING_DTYPE,
+    decode_embedding,
+    encode_embedding,
+    is_legacy_embedding,
+)
+from python_src.embeddings.generator import get_jina_embeddings_packed
 from python_src.hash_utils.hasher import (
     calculate_hash_from_content,
     extract_content_for_hashing,
 )
 from python_src.io.note_loader import read_markdown_with_frontmatter
-from python_src.io.output_writer import write_markdown_with_frontmatter
+from python_src.io.output_writer import write_markdown_batch
 import uuid
 from python_src.utils.db import get_db_connection
 from python_src.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# 预处理（读取、哈希）笔记的线程数
+_PREP_WORKERS = 8
+
+
+def _prepare_note(abs_path: str, max_chars: int) -> Optional[Tuple[str, Dict, str, str]]:
+    """读取并预处理单篇笔记，返回 (body, frontmatter, content_hash, processed_content)；文件不存在时返回 None。
+
+    只做文件读取与计算，不访问数据库，可在线程池中执行。"""
+    if not os.path.exists(abs_path):
+        return None
+
+    # 读取内容 - read_markdown_with_frontmatter 已经过滤了边界标记之后的内容
+    body, fm, _ = read_markdown_with_frontmatter(abs_path)
+
+    # 为了哈希计算，我们还是需要使用 extract_content_for_hashing
+    content_to_hash = extract_content_for_hashing(body)
+    if content_to_hash is None:
+        # 如果没有 boundary marker，就用整个 body
+        content_to_hash = body.rstrip("\r\n") + "\n"
+
+    # 计算哈希
+    content_hash = calculate_hash_from_content(content_to_hash)
+
+    # 使用纯正文内容（没有哈希边界后的内容）进行嵌入处理
+    # 限制字符数量
+    processed_content = body[:max_chars]
+    return body, fm, content_hash, processed_content
+
 
 def process_and_embed_notes(
     project_root_abs: str,
@@ -29,22 +65,40 @@ def process_and_embed_notes(
     jina_model_name_to_use: str,
     max_chars_for_jina_to_use: int,
     embedding_batch_size: int = EMBEDDING_BATCH_SIZE,
+    jina_concurrency: int = JINA_CONCURRENCY,
+    conn: Optional[sqlite3.Connection] = None,
 ) -> Dict:
-    """处理笔记，生成嵌入并保存到 SQLite。返回与旧版兼容的数据结构。"""
-    conn = get_db_connection(embeddings_db_path)
+    """处理笔记，生成嵌入并保存到 SQLite。返回与旧版兼容的数据结构。
+
+    每次读取 embedding_batch_size × jina_concurrency 个文件，其中需要嵌入的笔记
+    分成至多 jina_concurrency 个请求并发发送，完成后统一写库提交。
+    传入 conn 时复用该连接且不关闭，否则按 embeddings_db_path 自行打开。"""
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection(embeddings_db_path)
     cur = conn.cursor()
 
     # 从数据库预先加载 notes 表数据，构建映射: file_name -> {...}
     files_data_from_db: Dict[str, Dict] = {}
+    legacy_rows = []
     cur.execute(
         "SELECT file_name, content_hash, embedding, note_id FROM notes"
     )
     for fp, h, emb_blob, nid in cur.fetchall():
+        embedding = decode_embedding(emb_blob)
         files_data_from_db[fp] = {
             "hash": h,
-            "embedding": json.loads(emb_blob) if emb_blob else None,
+            "embedding": embedding,
             "note_id": nid,
         }
+        if is_legacy_embedding(emb_blob):
+            legacy_rows.append((encode_embedding(embedding), nid))
+
+    # 旧版 JSON 文本嵌入就地改写为二进制格式，之后的运行无需再解析 JSON
+    if legacy_rows:
+        cur.executemany("UPDATE notes SET embedding = ? WHERE note_id = ?", legacy_rows)
+        conn.commit()
+        logger.info("已将 %s 条旧版 JSON 嵌入转换为二进制格式", len(legacy_rows))
 
     embedded_count = 0
     processed_files_this_run = 0
@@ -53,127 +107,134 @@ def process_and_embed_notes(
 
     # 批处理
     total_files = len(files_relative_to_project_root)
-    batch_size = embedding_batch_size
-    for batch_start in range(0, total_files, batch_size):
-        batch_files = files_relative_to_project_root[batch_start : batch_start + batch_size]
-        # 减少输出频率，仅在完成10%进度时输出
-        progress_percent = int((batch_start / total_files) * 100)
-        if progress_percent % 10 == 0 and (batch_start == 0 or (batch_start > 0 and int(((batch_start - batch_size) / total_files) * 100) < progress_percent)):
-            logger.info("批量处理进度：%s/%s (完成%d%%)", batch_start + 1, total_files, progress_percent)
-
-        batch_contents: List[str] = []
-        batch_file_info: List[Dict] = []
-
-        for rel_path in batch_files:
-            abs_path = os.path.join(project_root_abs, rel_path)
-            if not os.path.exists(abs_path):
-                logger.warning("文件不存在，已跳过并从 DB 删除: %s", rel_path)
-                # 删除 notes 记录和相关 scores 记录
-                cur.execute("SELECT note_id FROM notes WHERE file_name = ?", (rel_path,))
-                row = cur.fetchone()
-                if row:
-                    nid_to_remove = row[0]
-                    cur.execute("DELETE FROM notes WHERE note_id = ?", (nid_to_remove,))
-                    cur.execute("DELETE FROM scores WHERE note_id_a = ? OR note_id_b = ?", (nid_to_remove, nid_to_remove))
-                all_files_data_for_return.pop(rel_path, None)
-                continue
-
-            # 读取内容 - read_markdown_with_frontmatter 已经过滤了边界标记之后的内容
-            body, fm, _ = read_markdown_with_frontmatter(abs_path)
-
-            # 处理 note_id
-            note_id = fm.get("note_id")
-            if not note_id:
-                note_id = str(uuid.uuid4())
-                fm["note_id"] = note_id
-                # 将新的 note_id 写回文件
-                write_markdown_with_frontmatter(abs_path, fm, body)
-
-            
-            # 为了哈希计算，我们还是需要使用 extract_content_for_hashing
-            content_to_hash = extract_content_for_hashing(body)
-            if content_to_hash is None:
-                # 如果没有 boundary marker，就用整个 body
-                content_to_hash = body.rstrip("\r\n") + "\n"
-            
-            # 计算哈希
-            content_hash = calculate_hash_from_content(content_to_hash)
-            
-            # 使用纯正文内容（没有哈希边界后的内容）进行嵌入处理
-            # 限制字符数量
-            processed_content = body[:max_chars_for_jina_to_use]
-
-            existing = files_data_from_db.get(rel_path)
-
-            # 判断是否需要重新嵌入：数据库已存同哈希且有嵌入
-            if (
-                existing
-                and existing["hash"] == content_hash
-                and existing["embedding"] is not None
-            ):
-                logger.debug("跳过文件 %s (哈希未变化，已有嵌入)", rel_path)
-                all_files_data_for_return[rel_path] = existing
-                skipped_files_count += 1
-                continue
-
-            batch_contents.append(processed_content)
-            batch_file_info.append(
-                {
-                    "file_path": rel_path,
-                    "content_hash": content_hash,
-                    "note_id": note_id,
-                }
+    batch_size = embedding_batch_size * max(1, jina_concurrency)
+    # 新 note_id 的写回交给后台线程，与本批的 Jina 请求重叠进行；
+    # 提交本批 upsert 之前先等待写回结果，写回失败的笔记不写入新 note_id
+    with ThreadPoolExecutor(max_workers=1) as write_executor, ThreadPoolExecutor(
+        max_workers=_PREP_WORKERS
+    ) as prep_executor:
+
+        def submit_prepare(start: int):
+            """提交 [start, start + batch_size) 的预处理任务，返回按文件顺序产出结果的迭代器。"""
+            return prep_executor.map(
+                lambda rel: _prepare_note(os.path.join(project_root_abs, rel), max_chars_for_jina_to_use),
+                files_relative_to_project_root[start : start + batch_size],
             )
 
-        if not batch_contents:
-            continue
-
-        embeddings = get_jina_embeddings_batch(
-            batch_contents,
-            jina_api_key_to_use=jina_api_key_to_use,
-            jina_model_name_to_use=jina_model_name_to_use,
-        )
-        for info, emb in zip(batch_file_info, embeddings):
-            rel_path = info["file_path"]
-            note_id_val = info["note_id"]
-            cur.execute(
-                """
-                INSERT INTO notes (note_id, file_name, content_hash, embedding)
-                VALUES (?, ?, ?, ?)
-                ON CONFLICT(note_id) DO UPDATE SET
-                    file_name = excluded.file_name,
-                    content_hash = excluded.content_hash,
-                    embedding    = excluded.embedding
-                """,
-                (
-                    note_id_val,
-                    rel_path,
-                    info["content_hash"],
-                    json.dumps(emb) if emb else None,
-                ),
-            )
-            all_files_data_for_return[rel_path] = {
-                "hash": info["content_hash"],
-                "embedding": emb,
-                "note_id": note_id_val,
-            }
-            if emb:
-                embedded_count += 1
-            processed_files_this_run += 1
+        next_prepared = submit_prepare(0)
+        for batch_start in range(0, total_files, batch_size):
+            batch_files = files_relative_to_project_root[batch_start : batch_start + batch_size]
+            # 双缓冲：本批结果在手后立即提交下一批的预处理，使其与本批的 Jina 请求重叠
+            prepared = next_prepared
+            if batch_start + batch_size < total_files:
+                next_prepared = submit_prepare(batch_start + batch_size)
+            # 减少输出频率，仅在完成10%进度时输出
+            progress_percent = int((batch_start / total_files) * 100)
+            if progress_percent % 10 == 0 and (batch_start == 0 or (batch_start > 0 and int(((batch_start - batch_size) / total_files) * 100) < progress_percent)):
+                logger.info("批量处理进度：%s/%s (完成%d%%)", batch_start + 1, total_files, progress_percent)
+
+            batch_contents: List[str] = []
+            batch_file_info: List[Dict] = []
+            # 新分配 note_id 的笔记在本批文件读完后统一提交给后台线程写回
+            pending_writes: List[tuple] = []
+
+            for rel_path, prepared_note in zip(batch_files, prepared):
+                abs_path = os.path.join(project_root_abs, rel_path)
+                if prepared_note is None:
+                    logger.warning("文件不存在，已跳过并从 DB 删除: %s", rel_path)
+                    # 删除 notes 记录和相关 scores 记录
+                    cur.execute("SELECT note_id FROM notes WHERE file_name = ?", (rel_path,))
+                    row = cur.fetchone()
+                    if row:
+                        nid_to_remove = row[0]
+                        cur.execute("DELETE FROM notes WHERE note_id = ?", (nid_to_remove,))
+                        cur.execute("DELETE FROM scores WHERE note_id_a = ? OR note_id_b = ?", (nid_to_remove, nid_to_remove))
+                    all_files_data_for_return.pop(rel_path, None)
+                    continue
+
+                body, fm, content_hash, processed_content = prepared_note
+
+                # 处理 note_id
+                note_id = fm.get("note_id")
+                if not note_id:
+                    note_id = str(uuid.uuid4())
+                    fm["note_id"] = note_id
+                    # 将新的 note_id 写回文件
+                    pending_writes.append((abs_path, fm, body))
+
+                existing = files_data_from_db.get(rel_path)
+
+                # 判断是否需要重新嵌入：数据库已存同哈希且有嵌入
+                if (
+                    existing
+                    and existing["hash"] == content_hash
+                    and existing["embedding"] is not None
+                ):
+                    logger.debug("跳过文件 %s (哈希未变化，已有嵌入)", rel_path)
+                    all_files_data_for_return[rel_path] = existing
+                    skipped_files_count += 1
+                    continue
+
+                batch_contents.append(processed_content)
+                batch_file_info.append(
+                    {
+                        "abs_path": abs_path,
+                        "file_path": rel_path,
+                        "content_hash": content_hash,
+                        "note_id": note_id,
+                    }
+                )
+
+            write_future = write_executor.submit(write_markdown_batch, pending_writes) if pending_writes else None
+            try:
+                # 变化的笔记先查嵌入缓存；未命中的按条数与总字符数打包，每包一次 Jina 请求，多个包并发发送
+                embeddings = get_jina_embeddings_packed(
+                    batch_contents,
+                    jina_api_key_to_use=jina_api_key_to_use,
+                    jina_model_name_to_use=jina_model_name_to_use,
+                    max_items=embedding_batch_size,
+                    concurrency=jina_concurrency,
+                    cache_conn=conn,
+                ) if batch_contents else []
+            finally:
+                # 无论请求是否出错都取回写回结果，写回异常不会被吞掉
+                failed_writes = set(write_future.result()) if write_future else set()
+
+            upsert_rows = []
+            for info, emb in zip(batch_file_info, embeddings):
+                rel_path = info["file_path"]
+                note_id_val = info["note_id"]
+                if info["abs_path"] in failed_writes:
+                    # 文件中没有这个新 note_id，下次运行会重新分配；不写入以免评分/标签指向孤立 id
+                    logger.warning("note_id 写回失败，本次不记录该笔记: %s", rel_path)
+                    continue
+                upsert_rows.append((note_id_val, rel_path, info["content_hash"], encode_embedding(emb)))
+                all_files_data_for_return[rel_path] = {
+                    "hash": info["content_hash"],
+                    "embedding": emb,
+                    "note_id": note_id_val,
+                }
+                if emb:
+                    embedded_count += 1
+                processed_files_this_run += 1
 
-        conn.commit()
+            # 一次 executemany 写入整批，复用同一条预编译语句
+            if upsert_rows:
+                cur.executemany(UPSERT_NOTE, upsert_rows)
+            conn.commit()
 
     # 更新元数据
-    cur.execute(
-        "INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)",
-        ("generated_at_utc", _dt.datetime.now(_dt.timezone.utc).isoformat()),
-    )
-    cur.execute(
-        "INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)",
-        ("jina_model_name", jina_model_name_to_use),
+    cur.executemany(
+        UPSERT_METADATA,
+        [
+            ("generated_at_utc", _dt.datetime.now(_dt.timezone.utc).isoformat()),
+            ("jina_model_name", jina_model_name_to_use),
+            ("embedding_dtype", EMBEDDING_DTYPE),
+        ],
     )
     conn.commit()
-    conn.close()
+    if own_conn:
+        conn.close()
 
     logger.info(
         "嵌入完成：共检查 %s 文件，跳过 %s 文件（未变化），处理 %s 文件，生成/更新 %s 嵌入。", 
@@ -2,17 +2,32 @@
 from __future__ import annotations
 
 import os
-from typing import Dict, List
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
 
 from python_src.ai_scoring.provider import call_ai_api_batch_for_relevance
 from python_src.ai_scoring.scorer import build_ai_batch_request
-from python_src.config import AI_SCORING_BATCH_SIZE, AI_SCORING_MAX_CHARS_PER_NOTE, AI_SCORING_MAX_TOTAL_CHARS
+from python_src.config import (
+    AI_SCORING_BATCH_SIZE,
+    AI_SCORING_CONCURRENCY,
+    AI_SCORING_MAX_CHARS_PER_NOTE,
+    AI_SCORING_MAX_TOTAL_CHARS,
+)
 from python_src.io.note_loader import read_markdown_with_frontmatter
-from python_src.utils.db import get_db_connection
+from python_src.utils.db import close_thread_connections, get_db_connection, upsert_scores_batch
 from python_src.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# 各评分批次共享的笔记读取线程数
+_READ_WORKERS = 8
+
+# 正文缓存最多保留的笔记数（LRU 淘汰）
+_BODY_CACHE_SIZE = 2048
+
 
 def score_candidates(
     candidate_pairs: List[Dict],
@@ -31,6 +46,8 @@ def score_candidates(
     max_chars_per_note: int = None,
     max_total_chars_per_request: int = None,
     save_api_responses: bool = True,
+    ai_concurrency: int = AI_SCORING_CONCURRENCY,
+    conn: Optional[sqlite3.Connection] = None,
 ) -> None:
     """对候选链接对进行 AI 评分并将结果写入 SQLite。
     
@@ -53,6 +70,8 @@ def score_candidates(
         max_chars_per_note: 每个笔记在AI评分时的最大字符数
         max_total_chars_per_request: 每个API批量请求的最大总字符数
         save_api_responses: 是否保存API响应内容到数据库
+        ai_concurrency: 同时进行中的批量 API 请求数（1 表示串行）
+        conn: 复用的数据库连接（不会被关闭）；为 None 时按 main_db_path 自行打开
     """
 
     if not candidate_pairs:
@@ -63,21 +82,22 @@ def score_candidates(
         logger.warning("3. 嵌入处理未正确执行")
         return
 
-    conn = get_db_connection(main_db_path)
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection(main_db_path)
     cur = conn.cursor()
 
-    # 过滤出有效的候选对
+    # 过滤出有效的候选对：候选对大量共享笔记，每个路径只 stat 一次
+    unique_paths = {path for pair in candidate_pairs for path in (pair["source_path"], pair["target_path"])}
+    existing_paths = {path for path in unique_paths if os.path.exists(os.path.join(project_root_abs, path))}
     valid_pairs = []
     for pair in candidate_pairs:
-        source_abs = os.path.join(project_root_abs, pair["source_path"])
-        target_abs = os.path.join(project_root_abs, pair["target_path"])
-        
         # 检查文件是否存在
-        if not os.path.exists(source_abs):
-            logger.warning("源文件不存在，跳过: %s", source_abs)
+        if pair["source_path"] not in existing_paths:
+            logger.warning("源文件不存在，跳过: %s", os.path.join(project_root_abs, pair["source_path"]))
             continue
-        if not os.path.exists(target_abs):
-            logger.warning("目标文件不存在，跳过: %s", target_abs)
+        if pair["target_path"] not in existing_paths:
+            logger.warning("目标文件不存在，跳过: %s", os.path.join(project_root_abs, pair["target_path"]))
             continue
             
         valid_pairs.append(pair)
@@ -92,12 +112,15 @@ def score_candidates(
             FROM scores
             """
         )
-        existing_pairs_raw = cur.fetchall()
-        existing_pairs: set[tuple[str, str]] = {(s, t) for s, t in existing_pairs_raw} | {(t, s) for s, t in existing_pairs_raw}
+        # 评分与方向无关：以 (较小路径, 较大路径) 作为规范键只存一份，无需再构造反向集合
+        existing_pairs: set[tuple[str, str]] = {
+            (s, t) if s <= t else (t, s) for s, t in cur.fetchall()
+        }
 
         before_count = len(valid_pairs)
         def need_score(p):
-            return (p["source_path"], p["target_path"]) not in existing_pairs
+            s, t = p["source_path"], p["target_path"]
+            return ((s, t) if s <= t else (t, s)) not in existing_pairs
 
         valid_pairs = [p for p in valid_pairs if need_score(p)]
         skipped = before_count - len(valid_pairs)
@@ -105,48 +128,73 @@ def score_candidates(
     
     if not valid_pairs:
         logger.info("没有需要 AI 评分的候选对，提前结束。")
+        if own_conn:
+            conn.close()
         return
         
     logger.info("AI 评分开始，有效候选对: %s/%s", len(valid_pairs), len(candidate_pairs))
 
-    # 按批处理
-    for batch_start in range(0, len(valid_pairs), ai_scoring_batch_size):
-        batch_pairs = valid_pairs[batch_start : batch_start + ai_scoring_batch_size]
-        # 减少日志输出频率，只在10%进度间隔输出
-        progress_percent = int((batch_start / len(valid_pairs)) * 100)
-        if progress_percent % 10 == 0 and (batch_start == 0 or (batch_start > 0 and int(((batch_start - ai_scoring_batch_size) / len(valid_pairs)) * 100) < progress_percent)):
-            logger.info("AI评分进度: %s/%s (完成%d%%)", batch_start + 1, len(valid_pairs), progress_percent)
+    # 根据设置决定是否使用自定义提示词
+    scoring_prompt = custom_scoring_prompt if use_custom_scoring_prompt else None
+    # 确定提示词类型
+    prompt_type = "custom" if use_custom_scoring_prompt else "default"
+
+    # 本次评分内共享的正文缓存（rel_path -> 读取截断后正文的 Future，读取失败时结果为 None）：
+    # 枢纽笔记会出现在许多批次中，只需读取与解析一次。缓存 Future 而非结果，并发批次请求
+    # 同一笔记时共用同一次读取；按 LRU 最多保留 _BODY_CACHE_SIZE 篇，只存截断后的正文。
+    body_cache: "OrderedDict[str, Future]" = OrderedDict()
+    body_cache_lock = threading.Lock()
+
+    def read_body(rel_path: str) -> Optional[str]:
+        """读取笔记正文并截断到 AI 评分使用的长度；失败时记录错误并返回 None。"""
+        abs_path = os.path.join(project_root_abs, rel_path)
+        try:
+            # 只读取 AI 评分使用长度所需的前缀，大笔记不再整篇读入
+            body, _, _ = read_markdown_with_frontmatter(abs_path, max_body_chars=max_content_length_for_ai_to_use)
+        except Exception as e:
+            logger.error("读取文件失败: %s, 错误: %s", abs_path, e)
+            return None
+        return body
+
+    def score_batch(batch_pairs: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """读取一批笔记内容并调用 AI 接口，返回 (prompt_pairs, results)。在线程池中执行，不访问 conn。"""
+        # 同一笔记在批内常出现于多个候选对中：去重后命中缓存的直接复用，其余提交到共享读取线程池
+        body_futures: Dict[str, Future] = {}
+        with body_cache_lock:
+            for path in dict.fromkeys(path for p in batch_pairs for path in (p["source_path"], p["target_path"])):
+                fut = body_cache.get(path)
+                if fut is None:
+                    fut = body_cache[path] = read_executor.submit(read_body, path)
+                    if len(body_cache) > _BODY_CACHE_SIZE:
+                        body_cache.popitem(last=False)
+                else:
+                    body_cache.move_to_end(path)
+                body_futures[path] = fut
+        bodies = {path: fut.result() for path, fut in body_futures.items()}
 
         # 构造 prompt_pairs
         prompt_pairs: List[Dict] = []
         for p in batch_pairs:
-            source_abs = os.path.join(project_root_abs, p["source_path"])
-            target_abs = os.path.join(project_root_abs, p["target_path"])
-            
-            try:
-                src_body, _, _ = read_markdown_with_frontmatter(source_abs)
-                tgt_body, _, _ = read_markdown_with_frontmatter(target_abs)
-                
-                prompt_pairs.append(
-                    {
-                        **p,
-                        "source_name": os.path.basename(p["source_path"]),
-                        "target_name": os.path.basename(p["target_path"]),
-                        "source_content": src_body[:max_content_length_for_ai_to_use],
-                        "target_content": tgt_body[:max_content_length_for_ai_to_use],
-                    }
-                )
-            except Exception as e:
-                logger.error("读取文件失败，跳过: %s 或 %s, 错误: %s", source_abs, target_abs, e)
+            src_body = bodies[p["source_path"]]
+            tgt_body = bodies[p["target_path"]]
+            if src_body is None or tgt_body is None:
+                logger.warning("跳过无法读取的链接对: %s ↔ %s", p["source_path"], p["target_path"])
                 continue
 
+            prompt_pairs.append(
+                {
+                    **p,
+                    "source_name": os.path.basename(p["source_path"]),
+                    "target_name": os.path.basename(p["target_path"]),
+                    "source_content": src_body,
+                    "target_content": tgt_body,
+                }
+            )
+
         if not prompt_pairs:
             logger.warning("该批次没有有效的提示对，跳过")
-            continue
+            return prompt_pairs, []
 
-        # 根据设置决定是否使用自定义提示词
-        scoring_prompt = custom_scoring_prompt if use_custom_scoring_prompt else None
-        
         try:
             # 传递新的批量处理参数
             data, headers, final_url = build_ai_batch_request(
@@ -161,9 +209,6 @@ def score_candidates(
                 max_total_chars=max_total_chars_per_request,
             )
 
-            # 确定提示词类型
-            prompt_type = "custom" if use_custom_scoring_prompt else "default"
-
             results = call_ai_api_batch_for_relevance(
                 ai_provider,
                 ai_model_name,
@@ -179,39 +224,69 @@ def score_candidates(
             )
         except Exception as e:
             logger.error("AI评分请求失败: %s", e)
-            continue
+            return prompt_pairs, []
+        return prompt_pairs, results
 
-        # note_id 需要查找或从 candidate_pairs 结构获取，假设 candidate_pairs 中包含 note_id_*.
-        rel_insert_rows = []
-        for r in results:
-            src_path = r["source_path"]
-            tgt_path = r["target_path"]
-
-            # 从 prompt_pairs 找 note_id
-            src_nid = next((pp.get("source_note_id") for pp in prompt_pairs if pp["source_path"] == src_path), "")
-            tgt_nid = next((pp.get("target_note_id") for pp in prompt_pairs if pp["target_path"] == tgt_path), "")
-
-            rel_insert_rows.append(
-                (
-                    src_nid,
-                    src_path,
-                    tgt_nid,
-                    tgt_path,
-                    r.get("ai_score"),
-                )
-            )
-        cur.executemany(
-            """
-            INSERT INTO scores (note_id_a, file_name_a, note_id_b, file_name_b, ai_score)
-            VALUES (?, ?, ?, ?, ?)
-            ON CONFLICT(note_id_a, note_id_b) DO UPDATE SET
-                ai_score = excluded.ai_score
-            """,
-            rel_insert_rows,
-        )
-        conn.commit()
+    # 按批处理：请求耗时主要在网络往返上，使用有界线程池让多个批次的请求重叠进行；
+    # 数据库写入仍在当前线程按完成顺序执行。
+    batches = [
+        valid_pairs[batch_start : batch_start + ai_scoring_batch_size]
+        for batch_start in range(0, len(valid_pairs), ai_scoring_batch_size)
+    ]
+    workers = max(1, min(ai_concurrency or 1, len(batches)))
+    logger.info("AI评分批次数: %s, 并发请求数: %s", len(batches), workers)
+
+    done_pairs = 0
+    last_logged_percent = -1
+    # 读取线程池在所有评分批次间共享，总读取线程数不随并发批次数增长
+    try:
+        with ThreadPoolExecutor(max_workers=_READ_WORKERS) as read_executor, ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(score_batch, batch_pairs) for batch_pairs in batches]
+            try:
+                for future in as_completed(futures):
+                    prompt_pairs, results = future.result()
+
+                    # 减少日志输出频率，只在10%进度间隔输出
+                    done_pairs += ai_scoring_batch_size
+                    progress_percent = min(100, int(done_pairs / len(valid_pairs) * 100)) // 10 * 10
+                    if progress_percent > last_logged_percent:
+                        last_logged_percent = progress_percent
+                        logger.info("AI评分进度: %s/%s (完成%d%%)", min(done_pairs, len(valid_pairs)), len(valid_pairs), progress_percent)
+
+                    if not results:
+                        continue
+
+                    # note_id 需要查找或从 candidate_pairs 结构获取，假设 candidate_pairs 中包含 note_id_*.
+                    # 路径 -> note_id 映射每批构建一次（reversed 使同一路径保留首次出现的值）
+                    src_nid_by_path = {pp["source_path"]: pp.get("source_note_id") for pp in reversed(prompt_pairs)}
+                    tgt_nid_by_path = {pp["target_path"]: pp.get("target_note_id") for pp in reversed(prompt_pairs)}
+                    rel_insert_rows = []
+                    for r in results:
+                        src_path = r["source_path"]
+                        tgt_path = r["target_path"]
+
+                        src_nid = src_nid_by_path.get(src_path, "")
+                        tgt_nid = tgt_nid_by_path.get(tgt_path, "")
 
-    conn.close()
+                        rel_insert_rows.append(
+                            (
+                                src_nid,
+                                src_path,
+                                tgt_nid,
+                                tgt_path,
+                                r.get("ai_score"),
+                            )
+                        )
+                    upsert_scores_batch(conn, rel_insert_rows)
+            except BaseException:
+                # 出错或 Ctrl-C 时取消尚未开始的批次，避免 with 退出时仍逐个发起付费的 AI 请求
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+    finally:
+        # 线程池已结束（或出错退出），关闭各工作线程复用的连接（保存 API 响应时打开）
+        close_thread_connections()
+        if own_conn:
+            conn.close()
     logger.info("AI 评分流程完成。")
 
 
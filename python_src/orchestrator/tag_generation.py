@@ -1,28 +1,55 @@
 """Batch AI tag generation pipeline."""
 from __future__ import annotations
 
+import functools
+import hashlib
 import os
+import re
 import json
 import uuid
 import time
+import sqlite3
 import requests
-from typing import List, Dict
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Optional
 
 from python_src.config import (
-    AI_API_REQUEST_DELAY_SECONDS,
     AI_SCORING_MAX_CHARS_PER_NOTE,
     AI_SCORING_MAX_TOTAL_CHARS,
     DEFAULT_AI_CONFIGS,
 )
 from python_src.ai_scoring.provider import save_api_response  # 用于落库请求/响应
-from python_src.ai_scoring.scorer import build_ai_batch_request  # 复用构造器
-from python_src.config import AI_SCORING_BATCH_SIZE
-from python_src.utils.db import get_db_connection
+from python_src.ai_scoring.scorer import build_ai_batch_request, extract_response_text  # 复用构造器/响应解析
+from python_src.config import AI_SCORING_BATCH_SIZE, AI_SCORING_CONCURRENCY
+from python_src.utils.db import (
+    close_thread_connections,
+    get_db_connection,
+    insert_note_tags_batch,
+    insert_tag_response_cache_batch,
+    thread_db_connection,
+)
 from python_src.io.note_loader import read_markdown_with_frontmatter
 from python_src.utils.logger import get_logger
+from python_src.utils.rate_limiter import ai_api_limiter, retry_after_seconds
 
 logger = get_logger(__name__)
 
+# 标签请求共用的 HTTP 会话：并发批次复用 keep-alive 连接，省去每次请求的 TCP/TLS 握手。
+# 连接池容量覆盖默认并发数，避免并发时连接被丢弃重建。
+_HTTP_SESSION = requests.Session()
+_HTTP_SESSION.mount("https://", HTTPAdapter(pool_maxsize=max(10, AI_SCORING_CONCURRENCY)))
+_HTTP_SESSION.mount("http://", HTTPAdapter(pool_maxsize=max(10, AI_SCORING_CONCURRENCY)))
+
+# 各标签批次共享的笔记读取线程数
+_READ_WORKERS = 8
+
+# 标签响应缓存每次 IN 查询的最大键数（低于 SQLite 变量上限）
+_CACHE_QUERY_CHUNK = 500
+
+# 标签分隔符：模型偶尔输出全角逗号，一次切分同时处理
+_TAG_SEPARATOR_RE = re.compile(r"[,，]")
+
 DEFAULT_TAG_PROMPT = """
 你是一位知识管理与卡片笔记法（Zettelkasten）专家，擅长构建结构清晰、易于连接和检索的个人知识库。
 
@@ -51,6 +78,91 @@ DEFAULT_TAG_PROMPT = """
 # ---------------------------------------------------------------------------
 
 
+@functools.lru_cache(maxsize=8)
+def _prompt_header(prompt_template: str) -> str:
+    """返回 user_prompt 中与批次无关的前缀（提示词模板 + 说明），每个模板只拼接一次。"""
+    return f"{prompt_template}\n\n以下是待生成标签的多篇笔记，请保持顺序，一行输出一篇笔记的标签：\n\n"
+
+
+def _build_openai_compatible_tag_request(
+    ai_provider: str, model_name: str, api_key: str, system_prompt: str, user_prompt: str, base_api_url: str | None
+):
+    """openai / deepseek / custom：Bearer 鉴权的 /chat/completions 请求。"""
+    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
+    # 如果用户传入自定义 base_api_url 优先使用；否则从默认映射表取
+    api_url = base_api_url or DEFAULT_AI_CONFIGS.get(ai_provider, {}).get("api_url", "")
+
+    # 对 OpenAI 兼容型接口，若 URL 看起来像域根或缺少 /chat/completions，则补全
+    if api_url.rstrip("/").endswith("api.openai.com") or api_url.rstrip("/").endswith("api.deepseek.com"):
+        api_url = api_url.rstrip("/") + "/v1/chat/completions" if ai_provider == "openai" else api_url.rstrip("/") + "/chat/completions"
+    batch_request = {
+        "model": model_name,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        "max_tokens": 5000,
+        "temperature": 1.0,
+    }
+    return batch_request, headers, api_url
+
+
+def _build_claude_tag_request(
+    ai_provider: str, model_name: str, api_key: str, system_prompt: str, user_prompt: str, base_api_url: str | None
+):
+    """claude：x-api-key 鉴权，固定使用默认接口地址。"""
+    headers = {
+        "x-api-key": api_key,
+        "content-type": "application/json",
+        "anthropic-version": "2023-06-01",
+    }
+    api_url = DEFAULT_AI_CONFIGS["claude"]["api_url"]
+    batch_request = {
+        "model": model_name,
+        "max_tokens": 5000,
+        "system": system_prompt,
+        "messages": [{"role": "user", "content": user_prompt}],
+        "temperature": 1.0,
+    }
+    return batch_request, headers, api_url
+
+
+def _build_gemini_tag_request(
+    ai_provider: str, model_name: str, api_key: str, system_prompt: str, user_prompt: str, base_api_url: str | None
+):
+    """gemini：返回 URL 根路径，模型名与 key 由调用方拼接。"""
+    headers = {"Content-Type": "application/json"}
+    api_url_root = base_api_url or DEFAULT_AI_CONFIGS["gemini"]["api_url"]
+    batch_request = {
+        "contents": [
+            {
+                "role": "user",
+                "parts": [
+                    {
+                        "text": user_prompt
+                    }
+                ]
+            }
+        ],
+        "systemInstruction": {
+            "role": "system",
+            "parts": [{"text": system_prompt}]
+        },
+        "generationConfig": {"temperature": 0.2, "maxOutputTokens": 5000},
+    }
+    return batch_request, headers, api_url_root
+
+
+# provider -> 请求构造函数，按字典查找分派，不再逐个比较 provider 名称
+_TAG_REQUEST_BUILDERS = {
+    "openai": _build_openai_compatible_tag_request,
+    "deepseek": _build_openai_compatible_tag_request,
+    "custom": _build_openai_compatible_tag_request,
+    "claude": _build_claude_tag_request,
+    "gemini": _build_gemini_tag_request,
+}
+
+
 def build_tag_batch_request(
     ai_provider: str,
     model_name: str,
@@ -66,87 +178,31 @@ def build_tag_batch_request(
     single_note_limit = max_chars_per_note or AI_SCORING_MAX_CHARS_PER_NOTE
     max_total_length = max_total_chars or AI_SCORING_MAX_TOTAL_CHARS
 
-    # 拼装所有笔记内容
-    notes_text = ""
+    # 拼装所有笔记内容：先用长度判断是否超限，放得下才加入片段，最后一次 join
+    parts: List[str] = []
     total_length = 0
     for idx, note in enumerate(notes):
         title = note.get("title", f"Note{idx+1}")
         content = (note.get("content") or "")[:single_note_limit]
-        note_block = f"[笔记 {idx+1}]\n标题：{title}\n{content}\n\n"
-        if total_length + len(note_block) > max_total_length:
+        header = f"[笔记 {idx+1}]\n标题：{title}\n"
+        block_length = len(header) + len(content) + 2
+        if total_length + block_length > max_total_length:
             break
-        notes_text += note_block
-        total_length += len(note_block)
+        parts += (header, content, "\n\n")
+        total_length += block_length
+    notes_text = "".join(parts)
 
     # 无论是默认提示词还是自定义提示词，都添加固定的格式要求和结尾提示
     fixed_ending = "请严格按要求输出，不要输出多余的任何解释！"
     
     # 生成请求体
     system_prompt = "你是一位善于提炼知识标签的专家。"
-    user_prompt = (
-        f"{prompt_template}\n\n以下是待生成标签的多篇笔记，请保持顺序，一行输出一篇笔记的标签：\n\n{notes_text}\n" +
-        f"{fixed_ending}"
-    )
+    user_prompt = f"{_prompt_header(prompt_template)}{notes_text}\n{fixed_ending}"
 
-    if ai_provider in {"openai", "deepseek", "custom"}:
-        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
-        # 如果用户传入自定义 base_api_url 优先使用；否则从默认映射表取
-        api_url = base_api_url or DEFAULT_AI_CONFIGS.get(ai_provider, {}).get("api_url", "")
-
-        # 对 OpenAI 兼容型接口，若 URL 看起来像域根或缺少 /chat/completions，则补全
-        if ai_provider in {"openai", "deepseek", "custom"}:
-            if api_url.rstrip("/").endswith("api.openai.com") or api_url.rstrip("/").endswith("api.deepseek.com"):
-                api_url = api_url.rstrip("/") + "/v1/chat/completions" if ai_provider == "openai" else api_url.rstrip("/") + "/chat/completions"
-        batch_request = {
-            "model": model_name,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-            "max_tokens": 5000,
-            "temperature": 1.0,
-        }
-        return batch_request, headers, api_url
-
-    if ai_provider == "claude":
-        headers = {
-            "x-api-key": api_key,
-            "content-type": "application/json",
-            "anthropic-version": "2023-06-01",
-        }
-        api_url = DEFAULT_AI_CONFIGS["claude"]["api_url"]
-        batch_request = {
-            "model": model_name,
-            "max_tokens": 5000,
-            "system": system_prompt,
-            "messages": [{"role": "user", "content": user_prompt}],
-            "temperature": 1.0,
-        }
-        return batch_request, headers, api_url
-
-    if ai_provider == "gemini":
-        headers = {"Content-Type": "application/json"}
-        api_url_root = base_api_url or DEFAULT_AI_CONFIGS["gemini"]["api_url"]
-        batch_request = {
-            "contents": [
-                {
-                    "role": "user",
-                    "parts": [
-                        {
-                            "text": user_prompt
-                        }
-                    ]
-                }
-            ],
-            "systemInstruction": {
-                "role": "system",
-                "parts": [{"text": system_prompt}]
-            },
-            "generationConfig": {"temperature": 0.2, "maxOutputTokens": 5000},
-        }
-        return batch_request, headers, api_url_root
-
-    raise ValueError(f"Unsupported ai_provider: {ai_provider}")
+    builder = _TAG_REQUEST_BUILDERS.get(ai_provider)
+    if builder is None:
+        raise ValueError(f"Unsupported ai_provider: {ai_provider}")
+    return builder(ai_provider, model_name, api_key, system_prompt, user_prompt, base_api_url)
 
 
 # ---------------------------------------------------------------------------
@@ -156,30 +212,59 @@ def build_tag_batch_request(
 
 def parse_tag_batch_response(ai_provider: str, response_data: Dict | List):
     """提取模型返回的多行标签文本，返回纯文本。"""
-    content = ""
-    if ai_provider in {"openai", "custom", "deepseek"}:
-        content = response_data.get("choices", [{}])[0].get("message", {}).get("content", "")
-    elif ai_provider == "claude":
-        content = response_data.get("content", [{}])[0].get("text", "") if response_data else ""
-    elif ai_provider == "gemini":
-        if response_data.get("candidates"):
-            # 处理新旧两种格式的Gemini API响应
-            candidate = response_data["candidates"][0]
-            content_obj = candidate.get("content", {})
-            
-            # 新格式: candidates[0].content.text 直接包含文本
-            if "text" in content_obj:
-                content = content_obj["text"]
-            # 新格式: candidates[0].text 直接包含文本
-            elif "text" in candidate:
-                content = candidate["text"]
-            # 旧格式: candidates[0].content.parts[0].text
-            elif "parts" in content_obj:
-                parts = content_obj.get("parts", [])
-                if parts and "text" in parts[0]:
-                    content = parts[0]["text"]
-    
-    return content.strip()
+    if ai_provider not in _TAG_REQUEST_BUILDERS:
+        return ""
+    return (extract_response_text(ai_provider, response_data) or "").strip()
+
+
+def _split_tags(tags_line: str) -> List[str]:
+    """粗解析一行标签响应 "标题: 标签1,标签2"，返回去空白后的标签列表；没有冒号时整行视为标签。"""
+    head, sep, tail = tags_line.partition(":")
+    tags_str = tail if sep else head
+    return [tag for tag in (t.strip() for t in _TAG_SEPARATOR_RE.split(tags_str)) if tag]
+
+
+# ---------------------------------------------------------------------------
+# 标签响应缓存
+# ---------------------------------------------------------------------------
+
+
+def _tag_cache_key(ai_provider: str, prompt_template: str, title: str, content: str) -> str:
+    """按 (provider, 提示词模板, 标题, 实际写入提示词的正文) 计算缓存键；模型名作为缓存表主键的另一列。
+
+    content 应为按单篇上限截断后的正文，截断上限变化时缓存自然失效。"""
+    h = hashlib.blake2b(digest_size=16)
+    for part in (ai_provider, prompt_template, title, content):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _load_cached_tag_responses(db_path: str, model: str, keys: List[str]) -> Dict[str, str]:
+    """从 tag_response_cache 批量读取已缓存的响应行，返回 prompt_hash -> 响应行。
+
+    在线程池中调用，使用当前线程复用的连接；读取失败时视为全部未命中。
+    解析不出标签的旧缓存行视为未命中，让这些笔记重新请求。"""
+    cached: Dict[str, str] = {}
+    unique_keys = list(dict.fromkeys(keys))
+    if not unique_keys:
+        return cached
+    conn = thread_db_connection(db_path)
+    try:
+        for i in range(0, len(unique_keys), _CACHE_QUERY_CHUNK):
+            chunk = unique_keys[i : i + _CACHE_QUERY_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            cached.update(
+                (key, response)
+                for key, response in conn.execute(
+                    f"SELECT prompt_hash, response FROM tag_response_cache WHERE model = ? AND prompt_hash IN ({placeholders})",
+                    (model, *chunk),
+                )
+                if _split_tags(response)
+            )
+    except sqlite3.Error as exc:
+        logger.warning("读取标签响应缓存失败: %s", exc)
+    return cached
 
 
 # ---------------------------------------------------------------------------
@@ -208,16 +293,18 @@ def call_ai_api_batch_for_tags(
     batch_id = str(uuid.uuid4())
     logger.info("开始批量标签生成...")
 
+    # gemini 需要拼接 key；URL 在重试之间不变，只拼接一次
+    full_url = f"{api_url}/{model_name}:generateContent?key={api_key}" if ai_provider == "gemini" else api_url
+
+    # 请求体只序列化一次：各次重试发送同一份 UTF-8 字节，落库也直接复用该字符串
+    request_json = json.dumps(data, ensure_ascii=False)
+    request_body = request_json.encode("utf-8")
+
     for attempt in range(max_retries):
         try:
-            time.sleep(AI_API_REQUEST_DELAY_SECONDS)
+            ai_api_limiter.acquire()
 
-            # gemini 需要拼接 key
-            if ai_provider == "gemini":
-                full_url = f"{api_url}/{model_name}:generateContent?key={api_key}"
-                resp = requests.post(full_url, headers=headers, json=data, timeout=60)
-            else:
-                resp = requests.post(api_url, headers=headers, json=data, timeout=60)
+            resp = _HTTP_SESSION.post(full_url, headers=headers, data=request_body, timeout=60)
 
             resp.raise_for_status()
             resp_json = resp.json()
@@ -230,8 +317,9 @@ def call_ai_api_batch_for_tags(
                         batch_id,
                         ai_provider,
                         model_name,
-                        json.dumps(data, ensure_ascii=False),
-                        json.dumps(resp_json, ensure_ascii=False),
+                        request_json,
+                        # 直接保存原始响应文本，不再把解析结果重新序列化
+                        resp.content.decode("utf-8", errors="replace"),
                         prompt_type,
                     )
                 except Exception as exc:
@@ -239,7 +327,8 @@ def call_ai_api_batch_for_tags(
 
             content_text = parse_tag_batch_response("openai" if ai_provider == "deepseek" else ai_provider, resp_json)
 
-            lines = [ln.strip() for ln in content_text.splitlines() if ln.strip()]
+            # 每行只 strip 一次，空行由 filter(None, ...) 丢弃；strip 同时去掉 CRLF 中的 \r
+            lines = list(filter(None, map(str.strip, content_text.split("\n"))))
             results = []
             for idx, line in enumerate(lines):
                 note_id = prompt_notes[idx]["note_id"] if idx < len(prompt_notes) else None
@@ -248,7 +337,12 @@ def call_ai_api_batch_for_tags(
             return results
         except requests.exceptions.RequestException as exc:
             logger.error("标签生成API 调用失败 (%s/%s): %s", attempt + 1, max_retries, exc)
-            time.sleep(2 ** attempt)
+            response = getattr(exc, "response", None)
+            if response is not None and response.status_code == 429:
+                # 限流：暂停共享限流器，让所有并发批次一起退避
+                ai_api_limiter.pause(retry_after_seconds(response.headers, 2 ** attempt))
+            else:
+                time.sleep(2 ** attempt)
 
     logger.error("标签生成API 最终失败，放弃该批次")
     return []
@@ -269,40 +363,53 @@ def generate_tags(
     max_chars_per_note: int | None = AI_SCORING_MAX_CHARS_PER_NOTE,
     max_total_chars_per_request: int | None = AI_SCORING_MAX_TOTAL_CHARS,
     save_api_responses: bool = True,
+    conn: Optional[sqlite3.Connection] = None,
+    ai_concurrency: int = AI_SCORING_CONCURRENCY,
 ):
     """为已嵌入的笔记生成 AI 标签并保存到数据库。
     
     注意：此函数依赖于嵌入处理的结果，必须在执行嵌入处理后调用。
     支持处理单个笔记或批量处理多个笔记。
+    ai_concurrency 为同时进行中的批量 API 请求数（1 表示串行）。
     """
-    conn = get_db_connection(main_db_path)
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection(main_db_path)
     cur = conn.cursor()
 
     # 选择需要生成标签的笔记
-    cur.execute("SELECT note_id, file_name FROM notes WHERE embedding IS NOT NULL")
-    all_notes = cur.fetchall()
+    cur.execute("SELECT COUNT(*) FROM notes WHERE embedding IS NOT NULL")
+    embedded_total = cur.fetchone()[0]
 
-    if not all_notes:
+    if not embedded_total:
         logger.error("数据库中没有找到已嵌入的笔记！")
         logger.error("请确保已完成嵌入处理，数据库中有有效的嵌入数据")
-        conn.close()
+        if own_conn:
+            conn.close()
         return
 
+    # 智能模式下由 SQLite 借助 idx_note_tags_note 排除已有标签的笔记，无需在 Python 中做集合差
+    cur.execute(
+        """
+        SELECT n.note_id, n.file_name
+        FROM notes n
+        WHERE n.embedding IS NOT NULL
+          AND (? OR NOT EXISTS (SELECT 1 FROM note_tags t WHERE t.note_id = n.note_id))
+        """,
+        (force_regen,),
+    )
+    to_process = cur.fetchall()
     if not force_regen:
-        # 智能模式：过滤已有标签的笔记
-        cur.execute("SELECT DISTINCT note_id FROM note_tags")
-        existing_ids = {row[0] for row in cur.fetchall()}
-        to_process = [(nid, fp) for nid, fp in all_notes if nid not in existing_ids]
         logger.info("智能模式：跳过已有标签的 %d 个笔记，待处理 %d 个笔记", 
-                   len(existing_ids), len(to_process))
+                   embedded_total - len(to_process), len(to_process))
     else:
         # 强制模式：处理所有笔记
-        to_process = all_notes
         logger.info("强制模式：将为所有 %d 个笔记重新生成标签", len(to_process))
 
     if not to_process:
         logger.info("没有需要生成标签的笔记（所有笔记都已有标签）")
-        conn.close()
+        if own_conn:
+            conn.close()
         return
 
     # 调整日志信息，支持单个或多个笔记
@@ -313,32 +420,57 @@ def generate_tags(
 
     prompt_template = custom_prompt if use_custom_prompt else DEFAULT_TAG_PROMPT
 
-    # 批量处理，减少日志输出频率
-    for batch_start in range(0, len(to_process), batch_size):
-        batch_end = min(batch_start + batch_size, len(to_process))
-        current_batch = to_process[batch_start:batch_end]
-        
-        # 仅在每10%进度时输出日志
-        progress_percent = int((batch_start / len(to_process)) * 100)
-        if progress_percent % 10 == 0 and (batch_start == 0 or (batch_start > 0 and int(((batch_start - batch_size) / len(to_process)) * 100) < progress_percent)):
-            logger.info("AI标签生成进度: %s/%s (完成%d%%)", batch_start + 1, len(to_process), progress_percent)
-
-        prompt_notes: List[Dict] = []
-        for note_id, rel_path in current_batch:
-            abs_path = os.path.join(project_root_abs, rel_path)
-            try:
-                body, _, _ = read_markdown_with_frontmatter(abs_path)
-                prompt_notes.append({
-                    "note_id": note_id,
-                    "file_path": rel_path,
-                    "title": os.path.splitext(os.path.basename(rel_path))[0],
-                    "content": body[:max_content_length_for_ai],
-                })
-            except Exception as exc:
-                logger.warning("读取笔记失败 %s: %s", rel_path, exc)
+    def read_body(record: tuple) -> Optional[str]:
+        """读取笔记正文并截断到 AI 使用的长度；失败时记录警告并返回 None。"""
+        _, rel_path, abs_path, _ = record
+        try:
+            # 只读取 AI 使用长度所需的前缀，大笔记不再整篇读入
+            body, _, _ = read_markdown_with_frontmatter(abs_path, max_body_chars=max_content_length_for_ai)
+        except Exception as exc:
+            logger.warning("读取笔记失败 %s: %s", rel_path, exc)
+            return None
+        return body
+
+    def tag_batch(current_batch: List[tuple]) -> List[Dict]:
+        """读取一批笔记，先查标签响应缓存（强制模式跳过），只为未命中的笔记调用标签 API，返回原始结果列表。
+
+        在线程池中执行，不访问 conn。新请求得到的结果带有 cache_key，由调用方写回缓存。
+        智能模式只处理还没有标签的笔记，因此缓存命中来自重命名/重新加入的笔记、标签被删除的笔记，
+        以及上次运行中途失败、标签未写入的批次；已有标签的笔记在重复运行时本就不会再请求。"""
+        # 批内笔记提交到共享读取线程池并发读取（文件 I/O 期间释放 GIL），结果保持批内顺序
+        bodies = list(read_executor.map(read_body, current_batch))
+        prompt_notes: List[Dict] = [
+            {
+                "note_id": note_id,
+                "file_path": rel_path,
+                "title": title,
+                "content": body,
+            }
+            for (note_id, rel_path, _, title), body in zip(current_batch, bodies)
+            if body is not None
+        ]
 
         if not prompt_notes:
-            continue
+            return []
+
+        # 与 build_tag_batch_request 相同的单篇截断，使缓存键对应提示词中的实际文本
+        single_note_limit = max_chars_per_note or AI_SCORING_MAX_CHARS_PER_NOTE
+        cache_keys = {
+            note["note_id"]: _tag_cache_key(ai_provider, prompt_template, note["title"], note["content"][:single_note_limit])
+            for note in prompt_notes
+        }
+        # 强制模式不读缓存，总是重新请求；新结果仍写回缓存
+        cached = {} if force_regen else _load_cached_tag_responses(main_db_path, ai_model_name, list(cache_keys.values()))
+        hits = [
+            {"note_id": note["note_id"], "ai_response": cached[cache_keys[note["note_id"]]]}
+            for note in prompt_notes
+            if cache_keys[note["note_id"]] in cached
+        ]
+        prompt_notes = [note for note in prompt_notes if cache_keys[note["note_id"]] not in cached]
+        if hits:
+            logger.info("标签响应缓存命中 %s/%s 篇笔记", len(hits), len(hits) + len(prompt_notes))
+        if not prompt_notes:
+            return hits
 
         # 构建批量标签请求
         data, headers, final_url = build_tag_batch_request(
@@ -364,31 +496,62 @@ def generate_tags(
             db_path=main_db_path,
             prompt_type="tagging_custom" if use_custom_prompt else "tagging_default",
         )
-
-        # 解析返回 -> [(nid, tag, conf)]
-        insert_rows = []
         for raw in results:
-            note_id = raw.get("note_id")
-            tags_line = raw.get("ai_response", "")
-            # 粗解析: title: tag1, tag2
-            if ':' in tags_line:
-                _, tags_str = tags_line.split(':', 1)
-            else:
-                tags_str = tags_line
-            for tag in [t.strip() for t in tags_str.split(',') if t.strip()]:
-                insert_rows.append((note_id, tag, None))
-
-        cur.executemany(
-            """
-            INSERT OR IGNORE INTO note_tags (note_id, tag, confidence)
-            VALUES (?, ?, ?)
-            """,
-            insert_rows,
-        )
-        conn.commit()
-        logger.info("已写入 %s 条标签", len(insert_rows))
-
-    conn.close()
+            raw["cache_key"] = cache_keys.get(raw.get("note_id"))
+        return hits + results
+
+    # 按批处理：请求耗时主要在网络往返上，使用有界线程池让多个批次的请求重叠进行；
+    # 数据库写入仍在当前线程按完成顺序执行。
+    # 路径相关的字符串一次性算好：(note_id, rel_path, abs_path, title)
+    path_records = [
+        (nid, rel_path, os.path.join(project_root_abs, rel_path), os.path.splitext(os.path.basename(rel_path))[0])
+        for nid, rel_path in to_process
+    ]
+    batches = [
+        path_records[batch_start : batch_start + batch_size]
+        for batch_start in range(0, len(to_process), batch_size)
+    ]
+    workers = max(1, min(ai_concurrency or 1, len(batches)))
+    logger.info("AI标签批次数: %s, 并发请求数: %s", len(batches), workers)
+
+    done_notes = 0
+    last_logged_percent = -1
+    # 读取线程池在所有标签批次间共享，总读取线程数不随并发批次数增长
+    try:
+        with ThreadPoolExecutor(max_workers=_READ_WORKERS) as read_executor, ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(tag_batch, current_batch) for current_batch in batches]
+            try:
+                for future in as_completed(futures):
+                    results = future.result()
+
+                    # 减少日志输出频率，只在10%进度间隔输出
+                    done_notes += batch_size
+                    progress_percent = min(100, int(done_notes / len(to_process) * 100)) // 10 * 10
+                    if progress_percent > last_logged_percent:
+                        last_logged_percent = progress_percent
+                        logger.info("AI标签生成进度: %s/%s (完成%d%%)", min(done_notes, len(to_process)), len(to_process), progress_percent)
+
+                    # 解析返回 -> [(nid, tag, conf)]
+                    tag_rows = []
+                    cache_rows = []
+                    for raw in results:
+                        tags = _split_tags(raw.get("ai_response", ""))
+                        tag_rows.extend((raw.get("note_id"), tag, None) for tag in tags)
+                        # 只缓存解析出标签的响应：没有标签的笔记下次仍会被选中，缓存空响应只会被反复重放
+                        if tags and raw.get("cache_key"):
+                            cache_rows.append((ai_model_name, raw["cache_key"], raw["ai_response"]))
+                    written = insert_note_tags_batch(conn, tag_rows)
+                    logger.info("已写入 %s 条标签", written)
+                    insert_tag_response_cache_batch(conn, cache_rows)
+            except BaseException:
+                # 出错或 Ctrl-C 时取消尚未开始的批次，避免 with 退出时仍逐个发起付费的 AI 请求
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+    finally:
+        # 线程池已结束（或出错退出），关闭各工作线程复用的连接
+        close_thread_connections()
+        if own_conn:
+            conn.close()
     logger.info("AI 标签生成流程完成")
 
 __all__ = ["generate_tags"] 
\ No newline at end of file
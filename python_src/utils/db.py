@@ -1,29 +1,192 @@
 """SQLite 数据库连接与初始化助手。"""
 from __future__ import annotations
 
+import logging
 import os
-import sqlite3
-from typing import Dict, List, Tuple
 import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Tuple
 
+from python_src.db.statements import (
+    INSERT_AI_RESPONSE,
+    INSERT_EMBEDDING_CACHE,
+    INSERT_NOTE_TAG,
+    INSERT_TAG_RESPONSE_CACHE,
+    UPSERT_SCORE,
+)
 from python_src.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# 从建表脚本中提取第一个表名
+_CREATE_TABLE_RE = re.compile(r"CREATE TABLE\s+(?:IF NOT EXISTS\s+)?(\w+)", re.IGNORECASE)
+
+
+# 本地单文件数据库的连接参数：WAL + NORMAL 避免每次提交都 fsync，
+# 较大的页缓存与 mmap 加速索引查找；busy_timeout 让并发写入等待而不是直接报 "database is locked"。
+_CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -262144",  # 256 MiB（负数单位为 KiB）
+    "PRAGMA mmap_size = 268435456",  # 256 MiB
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA foreign_keys = ON",
+)
 
-def get_db_connection(db_path: str) -> sqlite3.Connection:
-    """获取 SQLite 连接，设置外键约束并返回。"""
-    conn = sqlite3.connect(db_path)
-    conn.execute("PRAGMA foreign_keys = ON")
+
+def get_db_connection(db_path: str, check_same_thread: bool = True) -> sqlite3.Connection:
+    """获取 SQLite 连接，应用 `_CONNECTION_PRAGMAS` 后返回。DEBUG 级别下记录执行的 SQL。"""
+    conn = sqlite3.connect(db_path, check_same_thread=check_same_thread)
+    for pragma in _CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    if logger.isEnabledFor(logging.DEBUG):
+        conn.set_trace_callback(lambda sql: logger.debug("SQL: %s", sql))
     return conn
 
 
+@contextmanager
+def shared_db_connection(db_path: str) -> Iterator[sqlite3.Connection]:
+    """打开一个供整个流程复用的连接，退出时保证关闭。
+
+    只能在创建它的线程中使用；线程池中的任务使用 `thread_db_connection`。"""
+    conn = get_db_connection(db_path)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+# 线程内复用的连接：线程池任务逐批访问同一数据库时，每个线程只打开一次连接、执行一次 PRAGMA。
+# 各线程的 {db_path: conn} 字典同时按 id 登记在 _THREAD_CONN_MAPS 中，供 close_thread_connections 统一关闭。
+_THREAD_CONNS = threading.local()
+_THREAD_CONN_MAPS: Dict[int, Dict[str, sqlite3.Connection]] = {}
+_THREAD_CONN_LOCK = threading.Lock()
+
+
+def thread_db_connection(db_path: str) -> sqlite3.Connection:
+    """返回当前线程对 db_path 的复用连接，首次调用时创建。
+
+    调用方不要关闭它；流程结束后由 `close_thread_connections` 统一关闭。"""
+    conns = getattr(_THREAD_CONNS, "conns", None)
+    if conns is None:
+        conns = _THREAD_CONNS.conns = {}
+    conn = conns.get(db_path)
+    if conn is None:
+        # 关闭由 close_thread_connections 在其他线程完成，因此关闭同线程检查
+        conn = conns[db_path] = get_db_connection(db_path, check_same_thread=False)
+        with _THREAD_CONN_LOCK:
+            _THREAD_CONN_MAPS[id(conns)] = conns
+    return conn
+
+
+def close_thread_connections() -> None:
+    """关闭所有线程通过 `thread_db_connection` 打开的连接。
+
+    应在使用这些连接的线程池结束后调用；之后再调用 `thread_db_connection` 会重新打开。"""
+    with _THREAD_CONN_LOCK:
+        maps = list(_THREAD_CONN_MAPS.values())
+        _THREAD_CONN_MAPS.clear()
+    for conns in maps:
+        for conn in conns.values():
+            conn.close()
+        conns.clear()
+
+
+# 进程内写锁（按数据库文件区分）：评分/标签在线程池中并发请求，同一数据库的落库串行化，
+# 避免 "database is locked"；不同数据库文件之间互不阻塞。
+_WRITE_LOCKS: Dict[str, threading.Lock] = {}
+_WRITE_LOCKS_GUARD = threading.Lock()
+
+
+def _write_lock_for(conn: sqlite3.Connection) -> threading.Lock:
+    """返回 conn 主数据库文件对应的写锁；内存数据库按连接区分。"""
+    db_file = conn.execute("PRAGMA database_list").fetchone()[2] or f":memory:{id(conn)}"
+    with _WRITE_LOCKS_GUARD:
+        lock = _WRITE_LOCKS.get(db_file)
+        if lock is None:
+            lock = _WRITE_LOCKS[db_file] = threading.Lock()
+    return lock
+
+
+def _write_batch(conn: sqlite3.Connection, sql: str, rows: Iterable[tuple]) -> int:
+    """executemany 批量写入，返回写入行数。
+
+    连接空闲时在单个 BEGIN IMMEDIATE ... COMMIT 事务中写入；调用方已有未结束的事务时，
+    只在 SAVEPOINT 内写入并保留该事务，提交与回滚由调用方负责，失败时只撤销本批写入。"""
+    rows = list(rows)
+    if not rows:
+        return 0
+    with _write_lock_for(conn):
+        if conn.in_transaction:
+            conn.execute("SAVEPOINT write_batch")
+            try:
+                conn.executemany(sql, rows)
+            except Exception:
+                conn.execute("ROLLBACK TO write_batch")
+                raise
+            finally:
+                conn.execute("RELEASE write_batch")
+            return len(rows)
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(sql, rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return len(rows)
+
+
+def insert_ai_responses_batch(conn: sqlite3.Connection, rows: Iterable[tuple]) -> int:
+    """批量写入 ai_responses。
+
+    rows: (batch_id, ai_provider, model_name, request_content, response_content, prompt_type)
+    """
+    return _write_batch(conn, INSERT_AI_RESPONSE, rows)
+
+
+def upsert_scores_batch(conn: sqlite3.Connection, rows: Iterable[tuple]) -> int:
+    """批量写入/更新 scores。
+
+    rows: (note_id_a, file_name_a, note_id_b, file_name_b, ai_score)
+    """
+    return _write_batch(conn, UPSERT_SCORE, rows)
+
+
+def insert_note_tags_batch(conn: sqlite3.Connection, rows: Iterable[tuple]) -> int:
+    """批量写入 note_tags，已存在的 (note_id, tag) 忽略。
+
+    rows: (note_id, tag, confidence)
+    """
+    return _write_batch(conn, INSERT_NOTE_TAG, rows)
+
+
+def insert_tag_response_cache_batch(conn: sqlite3.Connection, rows: Iterable[tuple]) -> int:
+    """批量写入 tag_response_cache，同键覆盖。
+
+    rows: (model, prompt_hash, response)
+    """
+    return _write_batch(conn, INSERT_TAG_RESPONSE_CACHE, rows)
+
+
+def insert_embedding_cache_batch(conn: sqlite3.Connection, rows: Iterable[tuple]) -> int:
+    """批量写入 embedding_cache，同键覆盖。
+
+    rows: (model, text_hash, dim, embedding)
+    """
+    return _write_batch(conn, INSERT_EMBEDDING_CACHE, rows)
+
+
 def initialize_database(db_path: str, schema_sql: str) -> None:  # pragma: no cover
     """如果数据库不存在，创建数据库并执行建表 SQL。"""
     if not os.path.exists(db_path):
         logger.info("创建新数据库: %s", db_path)
         os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
-        conn = sqlite3.connect(db_path)
+        conn = get_db_connection(db_path)
         conn.executescript(schema_sql)
         conn.commit()
         conn.close()
@@ -41,7 +204,7 @@ def check_table_exists(db_path: str, table_name: str) -> bool:
         bool: 表是否存在
     """
     if not os.path.exists(db_path):
-        logger.warning(f"数据库文件不存在: {db_path}")
+        logger.warning("数据库文件不存在: %s", db_path)
         return False
         
     conn = get_db_connection(db_path)
@@ -54,11 +217,11 @@ def check_table_exists(db_path: str, table_name: str) -> bool:
         
         # 只保留最简单的日志，删除详细的表结构输出
         if not exists:
-            logger.warning(f"表 '{table_name}' 不存在于数据库")
+            logger.warning("表 '%s' 不存在于数据库", table_name)
             
         return exists
     except Exception as e:
-        logger.error(f"检查表失败: {e}")
+        logger.error("检查表失败: %s", e)
         return False
     finally:
         conn.close()
@@ -74,20 +237,19 @@ def list_database_tables(db_path: str) -> List[str]:
         List[str]: 表名列表
     """
     if not os.path.exists(db_path):
-        logger.warning(f"数据库文件不存在: {db_path}")
+        logger.warning("数据库文件不存在: %s", db_path)
         return []
         
     conn = get_db_connection(db_path)
     cur = conn.cursor()
     
     try:
-        cur.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tables = [row[0] for row in cur.fetchall()]
+        tables = [name for (name,) in cur.execute("SELECT name FROM sqlite_master WHERE type='table'")]
         # 简化日志输出，不输出详细的表名列表
-        logger.info(f"数据库包含 {len(tables)} 个表")
+        logger.info("数据库包含 %s 个表", len(tables))
         return tables
     except Exception as e:
-        logger.error(f"列出表失败: {e}")
+        logger.error("列出表失败: %s", e)
         return []
     finally:
         conn.close()
@@ -99,18 +261,17 @@ def ensure_tables_exist(conn: sqlite3.Connection, schema_scripts: List[str]) ->
     cursor = conn.cursor()
     
     # 检查已存在的表
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-    existing_tables = {row[0] for row in cursor.fetchall()}
+    existing_tables = {name for (name,) in cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")}
     
     missing_tables = []
     
     for script in schema_scripts:
         # 提取表名和CREATE TABLE语句
-        table_matches = re.findall(r"CREATE TABLE\s+(?:IF NOT EXISTS\s+)?(\w+)", script, re.IGNORECASE)
-        if not table_matches:
+        table_match = _CREATE_TABLE_RE.search(script)
+        if not table_match:
             continue
             
-        table_name = table_matches[0]
+        table_name = table_match.group(1)
         
         if table_name not in existing_tables:
             missing_tables.append(table_name)
@@ -126,4 +287,18 @@ def ensure_tables_exist(conn: sqlite3.Connection, schema_scripts: List[str]) ->
     return missing_tables
 
 
-__all__ = ["get_db_connection", "initialize_database", "check_table_exists", "list_database_tables"] 
\ No newline at end of file
+__all__ = [
+    "get_db_connection",
+    "shared_db_connection",
+    "thread_db_connection",
+    "close_thread_connections",
+    "initialize_database",
+    "check_table_exists",
+    "list_database_tables",
+    "ensure_tables_exist",
+    "insert_ai_responses_batch",
+    "upsert_scores_batch",
+    "insert_note_tags_batch",
+    "insert_tag_response_cache_batch",
+    "insert_embedding_cache_batch",
+] 
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""线程安全的令牌桶限流器，用于约束并发 AI 请求的总速率。"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Mapping
+
+from python_src.config import AI_REQUEST_BURST, AI_TARGET_QPM, JINA_CONCURRENCY, JINA_TARGET_QPM
+
+
+class TokenBucket:
+    """令牌桶：以 rate_per_sec 的速率补充令牌，最多积攒 burst 个。
+
+    acquire() 取走一个令牌，没有令牌时阻塞到下一个令牌生成。多个线程共享同一实例时，
+    只限制总速率，不再让每个请求各自固定等待。"""
+
+    def __init__(self, rate_per_sec: float, burst: int = 1) -> None:
+        self.rate = rate_per_sec
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def configure(self, rate_per_sec: float, burst: int = 1) -> None:
+        """调整速率与突发上限（CLI 参数覆盖默认配置时调用）。"""
+        with self._lock:
+            self.rate = rate_per_sec
+            self.capacity = max(1, burst)
+            self._tokens = min(self._tokens, float(self.capacity))
+
+    def pause(self, seconds: float) -> None:
+        """收到 429 时调用：在 seconds 秒内暂停所有共享该实例的请求。"""
+        if seconds <= 0:
+            return
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+            # 暂停期间不积攒令牌：恢复时只放行一个请求，之后仍按 rate 逐个放行
+            self._tokens = min(self._tokens, 1.0)
+
+    def acquire(self) -> None:
+        """取走一个令牌，必要时阻塞等待。rate <= 0 表示不限速（pause 仍然生效）。"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._resume_at - now)
+            if self.rate > 0:
+                start = max(now, self._resume_at)
+                self._tokens = min(self.capacity, self._tokens + max(0.0, now - self._updated) * self.rate)
+                self._updated = start
+                # 先记账再在锁外等待：排队的线程各自预留后续的令牌，按到达顺序依次放行
+                self._tokens -= 1
+                if self._tokens < 0:
+                    wait += -self._tokens / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+
+def retry_after_seconds(headers: Mapping[str, str] | None, default: float) -> float:
+    """解析 Retry-After 响应头（秒数形式），缺失或无法解析时返回 default。"""
+    try:
+        return max(0.0, float((headers or {}).get("Retry-After", default)))
+    except (TypeError, ValueError):
+        return default
+
+
+# 评分与标签请求共用的限流器；默认保守，可通过 --ai_target_qpm / --ai_request_burst 调高
+ai_api_limiter = TokenBucket(AI_TARGET_QPM / 60, burst=AI_REQUEST_BURST)
+
+# 所有并发嵌入分组共用的 Jina 限流器；默认不限速，只在 429 时整体暂停
+jina_api_limiter = TokenBucket(JINA_TARGET_QPM / 60, burst=JINA_CONCURRENCY)
+
+
+__all__ = ["TokenBucket", "ai_api_limiter", "jina_api_limiter", "retry_after_seconds"]
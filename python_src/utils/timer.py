@@ -1,4 +1,5 @@
 import functools
+import logging
 import time
 import typing as T
 from .logger import get_logger
@@ -6,12 +7,18 @@ from .logger import get_logger
 F = T.TypeVar("F", bound=T.Callable[..., T.Any])
 
 def timeit(func: F) -> F:  # type: ignore[misc]
-    """Decorator: log execution time of func at DEBUG level."""
+    """Decorator: log execution time of func at DEBUG level.
+
+    When DEBUG is disabled the call goes straight through without timing."""
+    logger = get_logger()
+
     @functools.wraps(func)
     def wrapper(*args: T.Any, **kwargs: T.Any):  # type: ignore[override]
+        if not logger.isEnabledFor(logging.DEBUG):
+            return func(*args, **kwargs)
         start = time.perf_counter()
         try:
             return func(*args, **kwargs)
         finally:
-            get_logger().debug("%s took %.2fs", func.__name__, time.perf_counter() - start)
+            logger.debug("%s took %.2fs", func.__name__, time.perf_counter() - start)
     return T.cast(F, wrapper)
\ No newline at end of file
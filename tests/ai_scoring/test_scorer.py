@@ -0,0 +1,53 @@
+# tests/ai_scoring/test_scorer.py
+
+from python_src.ai_scoring.scorer import extract_scores_from_text, parse_ai_batch_response
+
+
+def test_extract_scores_clean_csv():
+    """
+    测试最常见的情况：模型严格按 '分数1,分数2,...' 格式回复。
+    """
+    assert extract_scores_from_text("8, 6,10,0", 4) == [8, 6, 10, 0]
+
+
+def test_extract_scores_out_of_range_becomes_zero():
+    """
+    超出 0-10 范围的数字应被置为 0。
+    """
+    assert extract_scores_from_text("8,11,3", 3) == [8, 0, 3]
+
+
+def test_extract_scores_from_verbose_text():
+    """
+    模型回复夹杂解释文字时，回退到正则提取，并在达到预期数量后停止。
+    """
+    text = "评分如下：第一对 7 分，第二对 10 分，第三对 2 分。其余 5 6 7 不计。"
+    assert extract_scores_from_text(text, 3) == [7, 10, 2]
+
+
+def test_extract_scores_pads_missing_with_zero():
+    """
+    回复中的分数不足时用 0 补齐，且不会重复计入快速路径已解析的分数。
+    """
+    assert extract_scores_from_text("7,8", 4) == [7, 8, 0, 0]
+
+
+def test_parse_batch_response_skips_incomplete_response():
+    """
+    响应缺少回复文本（如 choices 为空）时不应写入全 0 的评分。
+    """
+    pairs = [{"source_path": "a.md", "target_path": "b.md"}]
+    assert parse_ai_batch_response("openai", {"choices": []}, pairs) == []
+
+    ok = {"choices": [{"message": {"content": "9"}}]}
+    assert [r["ai_score"] for r in parse_ai_batch_response("openai", ok, pairs)] == [9]
+
+
+def test_parse_batch_response_warns_about_unscored_pairs(caplog):
+    """
+    取不到回复文本时，应以 warning 级别列出未评分的笔记对。
+    """
+    pairs = [{"source_path": "a.md", "target_path": "b.md"}]
+    with caplog.at_level("WARNING"):
+        parse_ai_batch_response("claude", {"content": []}, pairs)
+    assert "a.md ↔ b.md" in caplog.text
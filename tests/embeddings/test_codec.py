@@ -0,0 +1,67 @@
+# tests/embeddings/test_codec.py
+
+import json
+
+import numpy as np
+
+from python_src.embeddings.codec import decode_embedding, encode_embedding, is_legacy_embedding
+
+
+def test_encode_decode_roundtrip():
+    """
+    编码为 BLOB 后再解码，数值误差应在 float16 精度范围内。
+    """
+    vec = [0.1, -0.25, 0.5, 0.0333]
+    blob = encode_embedding(vec)
+
+    assert isinstance(blob, bytes)
+    np.testing.assert_allclose(decode_embedding(blob), vec, atol=1e-3)
+
+    # float32 格式无损
+    exact = decode_embedding(encode_embedding(vec, dtype="float32"))
+    np.testing.assert_array_equal(exact, np.asarray(vec, dtype=np.float32))
+
+
+def test_decode_legacy_json_text():
+    """
+    旧数据库中以 JSON 文本保存的向量仍然可以读取。
+    """
+    vec = [0.1, 0.2, 0.3]
+    np.testing.assert_allclose(decode_embedding(json.dumps(vec)), vec, rtol=1e-6)
+    np.testing.assert_allclose(decode_embedding(json.dumps(vec).encode()), vec, rtol=1e-6)
+
+
+def test_empty_values():
+    """
+    空向量编码为 None，空 BLOB 解码为 None。
+    """
+    assert encode_embedding([]) is None
+    assert encode_embedding(None) is None
+    assert decode_embedding(None) is None
+    assert decode_embedding(b"") is None
+
+
+def test_is_legacy_embedding():
+    """
+    只有 JSON 文本格式被识别为旧格式。
+    """
+    assert is_legacy_embedding("[0.1, 0.2]")
+    assert is_legacy_embedding(b"[0.1, 0.2]")
+    assert not is_legacy_embedding(encode_embedding([0.1, 0.2]))
+    assert not is_legacy_embedding(None)
+
+
+def test_int8_roundtrip_preserves_cosine():
+    """
+    int8 量化编码后，余弦相似度与原向量的误差应很小，且体积约为 float16 的一半。
+    """
+    rng = np.random.default_rng(0)
+    a, b = rng.normal(size=(2, 1024)).astype(np.float32)
+    qa = decode_embedding(encode_embedding(a, dtype="int8"))
+    qb = decode_embedding(encode_embedding(b, dtype="int8"))
+
+    def cos(x, y):
+        return float(x @ y / (np.linalg.norm(x) * np.linalg.norm(y)))
+
+    assert abs(cos(qa, qb) - cos(a, b)) < 1e-3
+    assert len(encode_embedding(a, dtype="int8")) < len(encode_embedding(a)) // 2 + 8
@@ -1,11 +1,21 @@
 # tests/embeddings/test_generator.py
 
+import sqlite3
+import time
+
 import pytest
 from unittest.mock import patch, MagicMock
 import requests  # 导入真实的 requests 以便模拟它的异常
 
 # 导入您要测试的函数
-from python_src.embeddings.generator import get_jina_embedding
+from python_src.db.schema import MAIN_DB_SCHEMA
+from python_src.embeddings.generator import (
+    get_jina_embedding,
+    get_jina_embeddings_batch,
+    get_jina_embeddings_packed,
+    pack_batches,
+)
+from python_src.utils.rate_limiter import TokenBucket
 
 # 使用 @patch 装饰器，这是“模拟”魔法发生的地方
 # 我们要“假冒”的是 generator.py 文件里的 requests.post 函数
@@ -48,4 +58,61 @@ def test_get_jina_embedding_success(mock_post):
 
     # b. （进阶）断言我们的假 post 函数是否被正确地调用了
     mock_post.assert_called_once() # 确保它只被调用了一次
-    # 可以在这里更详细地检查调用参数，但对于初学者，到此为止已经很棒了
\ No newline at end of file
+    # 可以在这里更详细地检查调用参数，但对于初学者，到此为止已经很棒了
+
+
+def test_pack_batches_by_count_and_chars():
+    """
+    测试 pack_batches 同时按条数和累计字符数分组，超长文本独占一组。
+    """
+    texts = ["a" * 3, "b" * 3, "c" * 3, "d" * 10, "e" * 1]
+
+    assert list(pack_batches(texts, max_chars=100, max_items=2)) == [(0, 2), (2, 4), (4, 5)]
+    assert list(pack_batches(texts, max_chars=7, max_items=10)) == [(0, 2), (2, 3), (3, 4), (4, 5)]
+    assert list(pack_batches([], max_chars=7, max_items=10)) == []
+
+
+def test_packed_embeddings_use_cache():
+    """
+    测试提供 cache_conn 时，已缓存的文本不再请求 API，重复文本只请求一次。
+    """
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(MAIN_DB_SCHEMA)
+
+    def fake_batch(texts, **kwargs):
+        return [[float(len(t)), 0.5] for t in texts]
+
+    with patch('python_src.embeddings.generator.get_jina_embeddings_batch', side_effect=fake_batch) as mock_batch:
+        first = get_jina_embeddings_packed(["aa", "bbb", "aa"], "key", "model", cache_conn=conn)
+        assert first == [[2.0, 0.5], [3.0, 0.5], [2.0, 0.5]]
+        assert mock_batch.call_args_list[0].args[0] == ["aa", "bbb"]
+
+        second = get_jina_embeddings_packed(["bbb", "cccc"], "key", "model", cache_conn=conn)
+        assert second == [[3.0, 0.5], [4.0, 0.5]]
+        assert mock_batch.call_args_list[1].args[0] == ["cccc"]
+
+        # 换模型后缓存不命中
+        get_jina_embeddings_packed(["aa"], "key", "other-model", cache_conn=conn)
+        assert mock_batch.call_count == 3
+
+
+def test_batch_embedding_429_pauses_shared_limiter():
+    """
+    测试批量嵌入遇到 429 时按 Retry-After 暂停共享限流器，之后重试成功。
+    """
+    throttled = MagicMock(status_code=429, headers={"Retry-After": "0.2"}, text="rate limited")
+    throttled.raise_for_status.side_effect = requests.exceptions.HTTPError(response=throttled)
+    ok = MagicMock()
+    ok.json.return_value = {"data": [{"embedding": [0.1]}, {"embedding": [0.2]}]}
+
+    limiter = TokenBucket(rate_per_sec=0)
+    with patch('python_src.embeddings.generator.requests.post', side_effect=[throttled, ok]) as mock_post, \
+            patch('python_src.embeddings.generator.jina_api_limiter', limiter):
+        start = time.monotonic()
+        result = get_jina_embeddings_batch(["a", "b"], "key", "model", initial_delay=5.0)
+        elapsed = time.monotonic() - start
+
+    assert result == [[0.1], [0.2]]
+    assert mock_post.call_count == 2
+    # 等待时间取 Retry-After（0.2s），而不是 initial_delay（5s）
+    assert 0.2 <= elapsed < 2.0
@@ -0,0 +1,88 @@
+# tests/embeddings/test_similarity.py
+
+import subprocess
+import sys
+from pathlib import Path
+
+from python_src.embeddings.similarity import generate_candidate_pairs
+
+
+def _embeddings_data(vectors):
+    return {
+        "files": {
+            path: {"embedding": vec, "hash": f"h-{path}", "note_id": f"id-{path}"}
+            for path, vec in vectors.items()
+        }
+    }
+
+
+def test_generate_candidate_pairs_threshold_and_order():
+    """
+    只保留相似度不低于阈值的上三角笔记对，并按相似度降序排列。
+    """
+    data = _embeddings_data(
+        {
+            "a.md": [1.0, 0.0, 0.0],
+            "b.md": [0.9, 0.1, 0.0],
+            "c.md": [0.0, 1.0, 0.0],
+            "d.md": [1.0, 0.0, 0.0],
+            "e.md": None,  # 没有嵌入的笔记应被忽略
+        }
+    )
+
+    pairs = generate_candidate_pairs(data, 0.5)
+
+    assert [(p["source_path"], p["target_path"]) for p in pairs] == [
+        ("a.md", "d.md"),
+        ("a.md", "b.md"),
+        ("b.md", "d.md"),
+    ]
+    sims = [p["jina_similarity"] for p in pairs]
+    assert sims == sorted(sims, reverse=True)
+    assert abs(sims[0] - 1.0) < 1e-6
+    assert pairs[1]["source_note_id"] == "id-a.md"
+    assert pairs[1]["target_hash"] == "h-b.md"
+
+
+def test_generate_candidate_pairs_needs_two_embeddings():
+    """
+    少于两个有效嵌入时直接返回空列表。
+    """
+    assert generate_candidate_pairs(_embeddings_data({"a.md": [1.0, 0.0]}), 0.0) == []
+
+
+def test_generate_candidate_pairs_caps_neighbours_per_note():
+    """
+    设置 max_candidates_per_source 时，每篇笔记只保留最相似的 k 个邻居。
+    """
+    data = _embeddings_data(
+        {
+            "a.md": [1.0, 0.0],
+            "b.md": [0.95, 0.05],
+            "c.md": [0.8, 0.2],
+            "d.md": [0.0, 1.0],
+        }
+    )
+
+    pairs = generate_candidate_pairs(data, 0.0, max_candidates_per_source=1)
+
+    # a<->b 互为最近邻；c 的最近邻是 b；d 的最近邻是 c
+    assert {(p["source_path"], p["target_path"]) for p in pairs} == {
+        ("a.md", "b.md"),
+        ("b.md", "c.md"),
+        ("c.md", "d.md"),
+    }
+
+
+def test_small_vaults_do_not_import_faiss():
+    """
+    测试笔记数低于近似检索门槛时不导入 FAISS（在子进程中检查，避免受其他测试已导入模块的影响）。
+    """
+    code = (
+        "import sys\n"
+        "from python_src.embeddings.similarity import generate_candidate_pairs\n"
+        "data = {'files': {str(i): {'embedding': [1.0, float(i)]} for i in range(10)}}\n"
+        "generate_candidate_pairs(data, 0.5, max_candidates_per_source=3)\n"
+        "assert 'faiss' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=Path(__file__).resolve().parents[2])
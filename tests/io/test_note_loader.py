@@ -0,0 +1,52 @@
+# tests/io/test_note_loader.py
+
+from python_src.io import note_loader
+from python_src.io.note_loader import list_markdown_files, read_markdown_with_frontmatter
+
+
+def test_list_markdown_files_exclusions(tmp_path):
+    """
+    测试 list_markdown_files 的文件夹名排除、路径排除与文件名模式排除，结果为相对路径。
+    """
+    files = [
+        "a.md",
+        "notes/b.md",
+        "notes/deep/c.md",
+        "notes/template-x.md",
+        "Scripts/s.md",
+        "music/sub/d.md",
+        "music/e.md",
+        "other.txt",
+    ]
+    for rel in files:
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("x", encoding="utf-8")
+
+    result = list_markdown_files(
+        str(tmp_path),
+        str(tmp_path),
+        excluded_folders=["scripts", "music/sub"],
+        excluded_files_patterns=["template*"],
+    )
+
+    assert sorted(result) == ["a.md", "music/e.md", "notes/b.md", "notes/deep/c.md"]
+
+
+def test_read_markdown_capped_matches_full_read(tmp_path, monkeypatch):
+    """
+    测试限长读取：front-matter 超过预留长度时仍完整解析，正文截断结果与完整读取后截断一致，边界标记被识别。
+    """
+    monkeypatch.setattr(note_loader, "_FRONTMATTER_READ_CHARS", 16)
+    note = tmp_path / "n.md"
+    note.write_text(
+        "---\ntitle: " + "长" * 100 + "\nnote_id: abc\n---\n正文" + "一二三四五六七八九十" * 5 + "\n<!-- HASH_BOUNDARY -->\n尾部",
+        encoding="utf-8",
+    )
+
+    full_body, full_fm, full_raw = read_markdown_with_frontmatter(str(note))
+    for cap in (5, 40, 1000):
+        body, fm, raw = read_markdown_with_frontmatter(str(note), max_body_chars=cap)
+        assert (body, fm, raw) == (full_body[:cap], full_fm, full_raw)
+    assert fm["note_id"] == "abc"
+    assert "尾部" not in full_body
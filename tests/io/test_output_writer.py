@@ -0,0 +1,86 @@
+# tests/io/test_output_writer.py
+
+import json
+import os
+
+from python_src.config import DEFAULT_MAIN_DB_FILE_NAME
+from python_src.db.schema import MAIN_DB_SCHEMA
+from python_src.hash_utils.hasher import HASH_BOUNDARY_MARKER
+from python_src.io.output_writer import (
+    export_ai_scores_to_json,
+    export_ai_tags_to_json,
+    write_markdown_batch,
+    write_markdown_with_frontmatter,
+)
+from python_src.utils.db import get_db_connection, insert_note_tags_batch, upsert_scores_batch
+
+
+def test_exports_reuse_passed_connection(tmp_path):
+    """
+    测试传入共享连接时：评分与标签导出都复用该连接且不关闭它。
+    """
+    conn = get_db_connection(str(tmp_path / DEFAULT_MAIN_DB_FILE_NAME))
+    conn.executescript(MAIN_DB_SCHEMA)
+    conn.execute("INSERT INTO notes (note_id, file_name, content_hash) VALUES ('a', 'a.md', 'h')")
+    conn.commit()
+    upsert_scores_batch(
+        conn, [("a", "a.md", "b", "b.md", 8), ("a", "a.md", "c", "c.md", 3), ("a", "a.md", "d", "d.md", 9)]
+    )
+    insert_note_tags_batch(conn, [("a", "x", None)])
+
+    export_ai_scores_to_json(str(tmp_path), str(tmp_path), min_score=7, conn=conn)
+    export_ai_tags_to_json(str(tmp_path), str(tmp_path), conn=conn)
+
+    scores = json.loads((tmp_path / ".jina-linker" / "ai_scores.json").read_text(encoding="utf-8"))
+    tags = json.loads((tmp_path / ".jina-linker" / "ai_tags.json").read_text(encoding="utf-8"))
+    assert scores["ai_scores_by_source"] == {"a.md": [["d.md", 9], ["b.md", 8]]}
+    assert tags["ai_tags_by_note"] == {"a.md": ["x"]}
+
+    # 连接仍可用
+    assert conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0] == 3
+    conn.close()
+
+
+def test_write_markdown_keeps_post_boundary_content(tmp_path):
+    """
+    测试写回 front-matter 时保留哈希边界标记之后的内容（CRLF 换行统一为 LF）。
+    """
+    note = tmp_path / "note.md"
+    note.write_bytes(f"正文\r\n{HASH_BOUNDARY_MARKER}\r\n[[链接]]\r\n".encode("utf-8"))
+
+    write_markdown_with_frontmatter(str(note), {"note_id": "abc"}, "新正文\n")
+
+    text = note.read_text(encoding="utf-8")
+    assert text.startswith("---\nnote_id: abc\n---\n新正文")
+    assert text.endswith(f"{HASH_BOUNDARY_MARKER}\n[[链接]]\n")
+
+
+def test_write_markdown_skips_unchanged_file(tmp_path):
+    """
+    测试渲染结果与磁盘内容一致时不重写文件（mtime 不变）。
+    """
+    note = tmp_path / "note.md"
+    write_markdown_with_frontmatter(str(note), {"note_id": "abc"}, "正文\n")
+    os.utime(note, ns=(1_000_000_000, 1_000_000_000))
+
+    write_markdown_with_frontmatter(str(note), {"note_id": "abc"}, "正文\n")
+    assert note.stat().st_mtime_ns == 1_000_000_000
+
+    write_markdown_with_frontmatter(str(note), {"note_id": "xyz"}, "正文\n")
+    assert note.stat().st_mtime_ns != 1_000_000_000
+    assert "note_id: xyz" in note.read_text(encoding="utf-8")
+
+
+def test_write_markdown_batch_reports_failed_paths(tmp_path):
+    """
+    测试批量写回：返回写入失败的路径，成功的文件照常写入。
+    """
+    ok = tmp_path / "ok.md"
+    missing_dir = tmp_path / "missing" / "bad.md"
+
+    failed = write_markdown_batch(
+        [(str(ok), {"note_id": "a"}, "正文\n"), (str(missing_dir), {"note_id": "b"}, "正文\n")],
+    )
+
+    assert failed == [str(missing_dir)]
+    assert "note_id: a" in ok.read_text(encoding="utf-8")
@@ -0,0 +1,52 @@
+# tests/orchestrator/test_link_scoring.py
+
+import sqlite3
+import threading
+
+import pytest
+
+from python_src.orchestrator import link_scoring
+
+
+def test_score_candidates_cancels_queued_batches_on_error(tmp_path, monkeypatch):
+    """
+    测试写库出错时，尚未开始的评分批次被取消，不会再调用 AI 接口。
+    """
+    for i in range(11):
+        (tmp_path / f"n{i}.md").write_text(f"正文 {i}", encoding="utf-8")
+    pairs = [{"source_path": "n0.md", "target_path": f"n{i}.md", "jina_similarity": 0.9} for i in range(1, 11)]
+
+    calls = []
+    never_set = threading.Event()
+
+    def fake_call(ai_provider, model_name, api_key, api_url, prompt_pairs, *args, **kwargs):
+        calls.append(len(prompt_pairs))
+        if len(calls) > 1:
+            # 后续批次稍作停留，确保主线程先处理第一个批次的写库错误
+            never_set.wait(0.3)
+        return [{**p, "ai_score": 5} for p in prompt_pairs]
+
+    def failing_upsert(conn, rows):
+        raise RuntimeError("写库失败")
+
+    monkeypatch.setattr(link_scoring, "call_ai_api_batch_for_relevance", fake_call)
+    monkeypatch.setattr(link_scoring, "upsert_scores_batch", failing_upsert)
+
+    with pytest.raises(RuntimeError):
+        link_scoring.score_candidates(
+            pairs,
+            str(tmp_path),
+            ":memory:",
+            ai_provider="openai",
+            ai_api_url="",
+            ai_api_key="k",
+            ai_model_name="m",
+            max_content_length_for_ai_to_use=100,
+            force_rescore=True,
+            ai_scoring_batch_size=1,
+            ai_concurrency=1,
+            conn=sqlite3.connect(":memory:"),
+        )
+
+    # 第一个批次写库失败时，至多还有一个批次已在执行；其余批次都被取消
+    assert 1 <= len(calls) <= 2
@@ -0,0 +1,115 @@
+# tests/orchestrator/test_tag_generation.py
+
+import sqlite3
+import threading
+
+import pytest
+
+from python_src.db.schema import MAIN_DB_SCHEMA
+from python_src.orchestrator import tag_generation
+from python_src.orchestrator.tag_generation import _split_tags, _tag_cache_key
+
+
+def test_split_tags_handles_title_and_full_width_commas():
+    """
+    测试标签行解析：去掉 "标题:" 前缀，半角/全角逗号都作为分隔符，空标签被丢弃。
+    """
+    assert _split_tags("笔记: 哲学/古希腊哲学,伦理学，美德 ,") == ["哲学/古希腊哲学", "伦理学", "美德"]
+    assert _split_tags("标签A，标签B") == ["标签A", "标签B"]
+    assert _split_tags("") == []
+
+
+def test_tag_cache_key_covers_provider_and_prompt_text():
+    """
+    测试标签缓存键：provider、标题或写入提示词的正文不同时键不同。
+    """
+    key = _tag_cache_key("openai", "T", "标题", "正文")
+    assert key == _tag_cache_key("openai", "T", "标题", "正文")
+    assert key != _tag_cache_key("claude", "T", "标题", "正文")
+    assert key != _tag_cache_key("openai", "T", "标题", "正")
+    assert key != _tag_cache_key("openai", "T", "别的标题", "正文")
+
+
+def test_generate_tags_cancels_queued_batches_on_error(tmp_path, monkeypatch):
+    """
+    测试写库出错时，尚未开始的标签批次被取消，不会再调用标签 API。
+    """
+    db_path = str(tmp_path / "jina_data.db")
+    conn = sqlite3.connect(db_path)
+    conn.executescript(MAIN_DB_SCHEMA)
+    for i in range(10):
+        (tmp_path / f"n{i}.md").write_text(f"正文 {i}", encoding="utf-8")
+        conn.execute("INSERT INTO notes VALUES (?, ?, ?, ?)", (f"id{i}", f"n{i}.md", "h", b"\0"))
+    conn.commit()
+
+    calls = []
+    never_set = threading.Event()
+
+    def fake_call(ai_provider, model_name, api_key, api_url, prompt_notes, *args, **kwargs):
+        calls.append(len(prompt_notes))
+        if len(calls) > 1:
+            # 后续批次稍作停留，确保主线程先处理第一个批次的写库错误
+            never_set.wait(0.3)
+        return [{"note_id": note["note_id"], "ai_response": f"{note['title']}: 标签"} for note in prompt_notes]
+
+    def failing_insert(conn, rows):
+        raise RuntimeError("写库失败")
+
+    monkeypatch.setattr(tag_generation, "call_ai_api_batch_for_tags", fake_call)
+    monkeypatch.setattr(tag_generation, "insert_note_tags_batch", failing_insert)
+
+    with pytest.raises(RuntimeError):
+        tag_generation.generate_tags(
+            str(tmp_path),
+            db_path,
+            ai_provider="openai",
+            ai_api_url="",
+            ai_api_key="k",
+            ai_model_name="m",
+            max_content_length_for_ai=100,
+            force_regen=True,
+            batch_size=1,
+            save_api_responses=False,
+            conn=conn,
+            ai_concurrency=1,
+        )
+
+    # 第一个批次写库失败时，至多还有一个批次已在执行；其余批次都被取消
+    assert 1 <= len(calls) <= 2
+
+
+def test_generate_tags_does_not_cache_replies_without_tags(tmp_path, monkeypatch):
+    """
+    测试解析不出标签的响应不写入缓存：下次运行重新请求，而不是重放空响应。
+    """
+    db_path = str(tmp_path / "jina_data.db")
+    conn = sqlite3.connect(db_path)
+    conn.executescript(MAIN_DB_SCHEMA)
+    (tmp_path / "n0.md").write_text("正文", encoding="utf-8")
+    conn.execute("INSERT INTO notes VALUES ('id0', 'n0.md', 'h', ?)", (b"\0",))
+    conn.commit()
+    conn.close()
+
+    calls = []
+
+    def fake_call(ai_provider, model_name, api_key, api_url, prompt_notes, *args, **kwargs):
+        calls.append(len(prompt_notes))
+        return [{"note_id": note["note_id"], "ai_response": f"{note['title']}:"} for note in prompt_notes]
+
+    monkeypatch.setattr(tag_generation, "call_ai_api_batch_for_tags", fake_call)
+    for _ in range(2):
+        tag_generation.generate_tags(
+            str(tmp_path),
+            db_path,
+            ai_provider="openai",
+            ai_api_url="",
+            ai_api_key="k",
+            ai_model_name="m",
+            max_content_length_for_ai=100,
+            save_api_responses=False,
+        )
+
+    assert calls == [1, 1]
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM tag_response_cache").fetchone()[0] == 0
+    conn.close()
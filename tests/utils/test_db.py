@@ -0,0 +1,96 @@
+# tests/utils/test_db.py
+
+import sqlite3
+
+from python_src.db.schema import MAIN_DB_SCHEMA
+from python_src.utils.db import (
+    close_thread_connections,
+    get_db_connection,
+    insert_embedding_cache_batch,
+    insert_note_tags_batch,
+    thread_db_connection,
+    upsert_scores_batch,
+)
+
+
+def test_batch_writes_upsert_and_ignore(tmp_path):
+    """
+    测试批量写入：scores 按 (note_id_a, note_id_b) 更新分数，note_tags 忽略重复标签。
+    """
+    conn = get_db_connection(str(tmp_path / "main.db"))
+    conn.executescript(MAIN_DB_SCHEMA)
+
+    assert upsert_scores_batch(conn, [("a", "a.md", "b", "b.md", 5), ("a", "a.md", "c", "c.md", 7)]) == 2
+    upsert_scores_batch(conn, [("a", "a.md", "b", "b.md", 9)])
+    assert conn.execute("SELECT note_id_b, ai_score FROM scores ORDER BY note_id_b").fetchall() == [("b", 9), ("c", 7)]
+
+    insert_note_tags_batch(conn, [("a", "x", None), ("a", "x", None), ("a", "y", None)])
+    assert conn.execute("SELECT COUNT(*) FROM note_tags").fetchone()[0] == 2
+
+    assert upsert_scores_batch(conn, []) == 0
+    assert not conn.in_transaction
+    conn.close()
+
+
+def test_thread_connection_reused_until_closed(tmp_path):
+    """
+    测试线程复用连接：同一线程同一路径返回同一连接，close_thread_connections 后重新打开。
+    """
+    db_path = str(tmp_path / "main.db")
+    conn = thread_db_connection(db_path)
+    assert thread_db_connection(db_path) is conn
+
+    close_thread_connections()
+    reopened = thread_db_connection(db_path)
+    assert reopened is not conn
+    assert reopened.execute("SELECT 1").fetchone() == (1,)
+    close_thread_connections()
+
+
+def test_batch_write_leaves_caller_transaction_open(tmp_path):
+    """
+    测试调用方已有事务时：批量写入不提交也不回滚调用方的修改，写入失败只撤销本批。
+    """
+    conn = get_db_connection(str(tmp_path / "main.db"))
+    conn.executescript(MAIN_DB_SCHEMA)
+
+    conn.execute("INSERT INTO metadata (key, value) VALUES ('pending', '1')")
+    assert conn.in_transaction
+    insert_note_tags_batch(conn, [("a", "x", None)])
+    assert conn.in_transaction
+
+    try:
+        upsert_scores_batch(conn, [("a", "a.md", "b", "b.md", 5), (None, "a.md", "c", "c.md", 7)])
+    except sqlite3.IntegrityError:
+        pass
+    assert conn.in_transaction
+    assert conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0] == 0
+
+    conn.rollback()
+    assert conn.execute("SELECT COUNT(*) FROM note_tags").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM metadata WHERE key = 'pending'").fetchone()[0] == 0
+    conn.close()
+
+
+def test_embedding_cache_write_leaves_caller_transaction_open(tmp_path):
+    """
+    测试嵌入缓存写入：调用方已有事务时不提交也不回滚调用方的修改，写入失败只撤销本批。
+    """
+    conn = get_db_connection(str(tmp_path / "main.db"))
+    conn.executescript(MAIN_DB_SCHEMA)
+
+    conn.execute("INSERT INTO metadata (key, value) VALUES ('pending', '1')")
+    assert insert_embedding_cache_batch(conn, [("m", "h1", 2, b"\0\0")]) == 1
+    assert conn.in_transaction
+
+    try:
+        insert_embedding_cache_batch(conn, [("m", "h2", 2, b"\0\0"), ("m", "h3", None, b"\0")])
+    except sqlite3.IntegrityError:
+        pass
+    assert conn.in_transaction
+    assert conn.execute("SELECT text_hash FROM embedding_cache").fetchall() == [("h1",)]
+
+    conn.rollback()
+    assert conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM metadata WHERE key = 'pending'").fetchone()[0] == 0
+    conn.close()
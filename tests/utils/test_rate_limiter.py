@@ -0,0 +1,42 @@
+# tests/utils/test_rate_limiter.py
+
+import time
+
+from python_src.utils.rate_limiter import TokenBucket, retry_after_seconds
+
+
+def test_token_bucket_allows_burst_then_paces():
+    """
+    测试令牌桶：burst 个请求立即放行，之后按 rate 速率等待。
+    """
+    bucket = TokenBucket(rate_per_sec=20, burst=2)
+
+    start = time.monotonic()
+    bucket.acquire()
+    bucket.acquire()
+    assert time.monotonic() - start < 0.03
+
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.04
+
+
+def test_token_bucket_pause_delays_next_acquire():
+    """
+    测试 pause：收到 429 后，即使不限速，下一次 acquire 也会等待暂停结束。
+    """
+    bucket = TokenBucket(rate_per_sec=0)
+
+    start = time.monotonic()
+    bucket.pause(0.05)
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.05
+
+
+def test_retry_after_seconds():
+    """
+    测试 Retry-After 解析：秒数直接使用，缺失或无法解析时回退到默认值。
+    """
+    assert retry_after_seconds({"Retry-After": "7"}, 2.0) == 7.0
+    assert retry_after_seconds({}, 2.0) == 2.0
+    assert retry_after_seconds(None, 2.0) == 2.0
+    assert retry_after_seconds({"Retry-After": "Wed, 21 Oct 2026 07:28:00 GMT"}, 2.0) == 2.0